@@ -0,0 +1,37 @@
+"""
+Run one or more diagnostics in a single process
+
+Tokenizer and model loads are cached per process (see diagnostics.py), and
+torch/transformers are only imported by the subcommands that need them.
+
+Usage:
+    python diagnose.py template
+    python diagnose.py template training generation
+    python diagnose.py generation --generation-args "--quant none"
+"""
+import argparse
+import importlib
+import shlex
+
+SUBCOMMANDS = {
+    "template": "check_qwen_template",
+    "training": "diagnose_training",
+    "generation": "diagnose_generation_loop",
+}
+
+
+def main(subcommands, generation_args=()):
+    for name in subcommands:
+        module = importlib.import_module(SUBCOMMANDS[name])
+        if name == "generation":
+            module.main(list(generation_args))
+        else:
+            module.main()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthia fine-tuning diagnostics")
+    parser.add_argument("subcommands", nargs="+", choices=SUBCOMMANDS, help="Diagnostics to run, in order")
+    parser.add_argument("--generation-args", default="", help="Extra arguments for the generation diagnostic")
+    args = parser.parse_args()
+    main(args.subcommands, shlex.split(args.generation_args))
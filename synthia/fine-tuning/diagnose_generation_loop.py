@@ -1,113 +1,336 @@
 """
 Diagnose why the model gets stuck in infinite generation
 """
+import argparse
+import re
+import threading
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import StaticCache, StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+from diagnostics import buffered_output, load_model, load_model_fast_attention, load_tokenizer
 import time
 
 MODEL_PATH = "./outputs/qwen2.5-coder-synthia-merged/16bit"
+MAX_NEW_TOKENS = 50
 
-print("Loading model and tokenizer...")
-tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
-model = AutoModelForCausalLM.from_pretrained(
-    MODEL_PATH,
-    torch_dtype=torch.float16,
-    device_map="auto",
-)
-
-print("\n" + "="*80)
-print("TOKENIZER DIAGNOSTICS:")
-print("="*80)
-print(f"EOS token: {tokenizer.eos_token} (ID: {tokenizer.eos_token_id})")
-print(f"BOS token: {tokenizer.bos_token} (ID: {tokenizer.bos_token_id})")
-print(f"PAD token: {tokenizer.pad_token} (ID: {tokenizer.pad_token_id})")
-print(f"Chat template exists: {tokenizer.chat_template is not None}")
-
-# Check if im_end token exists
-im_end_id = tokenizer.convert_tokens_to_ids("<|im_end|>")
-print(f"<|im_end|> token ID: {im_end_id}")
-
-print("\n" + "="*80)
-print("GENERATION TEST (with streaming and early stop):")
-print("="*80)
-
-messages = [{"role": "user", "content": "Hello"}]
-formatted_input = tokenizer.apply_chat_template(
-    messages,
-    tokenize=False,
-    add_generation_prompt=True
-)
-
-print(f"Input:\n{formatted_input}\n")
-
-inputs = tokenizer(formatted_input, return_tensors="pt").to(model.device)
-
-print("Generating (max 50 tokens)...")
-start_time = time.time()
-
-# Generate with strict limits and proper stopping
-outputs = model.generate(
-    **inputs,
-    max_new_tokens=50,  # Strict limit
-    temperature=0.7,
-    do_sample=True,
-    pad_token_id=tokenizer.pad_token_id,
-    eos_token_id=tokenizer.eos_token_id,  # Use EOS token
-    early_stopping=True,
-)
-
-elapsed = time.time() - start_time
-print(f"Generation took {elapsed:.2f} seconds")
-
-# Decode and show output
-response = tokenizer.decode(outputs[0], skip_special_tokens=False)
-
-print("\n" + "="*80)
-print("OUTPUT (with special tokens):")
-print("="*80)
-print(response)
-
-print("\n" + "="*80)
-print("ANALYSIS:")
-print("="*80)
-
-# Count tokens
-new_tokens = outputs[0][len(inputs['input_ids'][0]):]
-print(f"Generated {len(new_tokens)} tokens")
-
-# Check if it hit EOS
-if tokenizer.eos_token_id in new_tokens.tolist():
-    print("✓ Model generated EOS token (stopped naturally)")
-else:
-    print("❌ Model did NOT generate EOS token (hit max_new_tokens limit)")
-    print("   This means the model doesn't know when to stop!")
-
-# Check if it generated im_end
-if im_end_id in new_tokens.tolist():
-    print("✓ Model generated <|im_end|> token")
-else:
-    print("❌ Model did NOT generate <|im_end|> token")
-
-# Check for hallucination markers in just the new tokens
-decoded_new = tokenizer.decode(new_tokens, skip_special_tokens=False)
-hallucination_markers = ["𝆣", "NdrFc", "𥖨", "คู่", "ניוזל", "zwłaszc"]
-found = [m for m in hallucination_markers if m in decoded_new]
-if found:
-    print(f"❌ HALLUCINATIONS FOUND: {found}")
-else:
-    print("✓ No hallucinations in generated tokens")
-
-print("\n" + "="*80)
-print("DIAGNOSIS:")
-print("="*80)
-
-if tokenizer.eos_token_id in new_tokens.tolist():
-    print("Model CAN stop properly. Problem might be:")
-    print("  - LM Studio not respecting EOS token")
-    print("  - Max tokens set too high in LM Studio")
-else:
-    print("Model CANNOT stop properly. Root causes:")
-    print("  1. EOS token not trained correctly")
-    print("  2. Chat template issue during training")
-    print("  3. Training data didn't include proper endings")
-    print("\nFIX: Need to retrain with correct EOS token handling")
+
+class StopOnTokens(StoppingCriteria):
+    """Stop as soon as every row in the batch has emitted one of stop_ids"""
+
+    def __init__(self, stop_ids):
+        self.stop_ids = stop_ids
+        self.finished = None
+
+    def __call__(self, input_ids, scores, **kwargs):
+        stop_ids = torch.tensor(self.stop_ids, device=input_ids.device)
+        just_stopped = torch.isin(input_ids[:, -1], stop_ids)
+        self.finished = just_stopped if self.finished is None else self.finished | just_stopped
+        return bool(self.finished.all())
+
+
+class StopOnEvent(StoppingCriteria):
+    """Stop once the given threading.Event is set"""
+
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return self.event.is_set()
+
+
+HALLUCINATION_MARKERS = ["𝆣", "NdrFc", "𥖨", "คู่", "ניוזล", "zwłaszc"]
+# One alternation scans the decoded text once instead of once per marker
+HALLUCINATION_PATTERN = re.compile("|".join(map(re.escape, HALLUCINATION_MARKERS)))
+
+# Probe prompts, generated together as one left-padded batch
+PROBE_PROMPTS = [
+    "Hello",
+    "What Python version do we have?",
+    "Run the tests",
+    "Find all Python files in the project",
+]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Check whether the merged model stops generating")
+    parser.add_argument(
+        "--backend",
+        choices=["hf", "vllm"],
+        default="hf",
+        help="Generation backend: HF generate or vLLM continuous batching (default: hf)",
+    )
+    parser.add_argument(
+        "--quant",
+        choices=["none", "int8", "nf4"],
+        default="none",
+        help="Opt-in bitsandbytes quantization for the HF diagnostic load; the default tests "
+        "the fp16 weights that get exported (default: none)",
+    )
+    parser.add_argument(
+        "--draft-model",
+        default=None,
+        help="Small same-family model for HF speculative decoding, e.g. Qwen/Qwen2.5-Coder-1.5B-Instruct",
+    )
+    parser.add_argument(
+        "--fail-fast",
+        action="store_true",
+        help="Stream each HF generation and stop it as soon as a hallucination marker appears",
+    )
+    parser.add_argument(
+        "--compile",
+        action="store_true",
+        help="torch.compile the decode step with CUDA graphs (batched HF generation with --quant none only)",
+    )
+    args = parser.parse_args(argv)
+    # fullgraph compilation can't trace through bitsandbytes' quantized linear layers
+    if args.compile and args.quant != "none":
+        parser.error("--compile requires --quant none")
+    return args
+
+
+def load_hf_model(quant):
+    """Load the merged model, preferring FlashAttention-2 over SDPA"""
+    return load_model_fast_attention(MODEL_PATH, quant=quant, torch_dtype=torch.float16, device_map="auto")
+
+
+def generate_assisted(model, draft_model, tokenizer, formatted_inputs, stop_ids):
+    """Speculative decoding with a draft model, returning the new tokens per prompt
+
+    HF assisted generation only supports batch size 1, so prompts run one at a time.
+    """
+    new_token_rows = []
+    for formatted_input in formatted_inputs:
+        inputs = tokenizer(formatted_input, return_tensors="pt").to(model.device)
+        with torch.inference_mode():
+            outputs = model.generate(
+                **inputs,
+                assistant_model=draft_model,
+                max_new_tokens=MAX_NEW_TOKENS,
+                temperature=0.7,
+                do_sample=True,
+                pad_token_id=tokenizer.pad_token_id,
+                eos_token_id=stop_ids,
+                stopping_criteria=StoppingCriteriaList([StopOnTokens(stop_ids)]),
+            )
+        new_token_rows.append(outputs[0, inputs["input_ids"].shape[-1]:])
+    return new_token_rows
+
+
+def generate_streaming(model, tokenizer, formatted_inputs, stop_ids):
+    """Stream each prompt and abort it once a hallucination marker shows up
+
+    TextIteratorStreamer only supports batch size 1, so prompts run one at a time.
+    """
+    new_token_rows = []
+    for formatted_input in formatted_inputs:
+        inputs = tokenizer(formatted_input, return_tensors="pt").to(model.device)
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=False)
+        hallucinated = threading.Event()
+        result = {}
+
+        def run():
+            with torch.inference_mode():
+                result["outputs"] = model.generate(
+                    **inputs,
+                    streamer=streamer,
+                    max_new_tokens=MAX_NEW_TOKENS,
+                    temperature=0.7,
+                    do_sample=True,
+                    pad_token_id=tokenizer.pad_token_id,
+                    eos_token_id=stop_ids,
+                    stopping_criteria=StoppingCriteriaList([StopOnTokens(stop_ids), StopOnEvent(hallucinated)]),
+                )
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        text = ""
+        for chunk in streamer:
+            text += chunk
+            if not hallucinated.is_set() and HALLUCINATION_PATTERN.search(text):
+                print(f"  Hallucination marker after {len(text)} chars, stopping early")
+                hallucinated.set()
+        thread.join()
+
+        new_token_rows.append(result["outputs"][0, inputs["input_ids"].shape[-1]:])
+    return new_token_rows
+
+
+def generate_hf(model, tokenizer, formatted_inputs, stop_ids, max_new_tokens=MAX_NEW_TOKENS):
+    """Generate all prompts as one left-padded batch, returning the new tokens per prompt"""
+    # Batched generation needs left padding so every row ends at the prompt boundary
+    tokenizer.padding_side = "left"
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+
+    inputs = tokenizer(formatted_inputs, return_tensors="pt", padding=True).to(model.device)
+
+    # Static KV cache sized for the whole run, so nothing is reallocated while
+    # decoding and the decode step can be captured as a CUDA graph (always
+    # MAX_NEW_TOKENS long, so the --compile warm-up sees the same shapes)
+    kv_cache = StaticCache(
+        config=model.config,
+        max_batch_size=inputs["input_ids"].shape[0],
+        max_cache_len=inputs["input_ids"].shape[-1] + MAX_NEW_TOKENS,
+        device=model.device,
+        dtype=torch.float16,
+    )
+
+    # Generate with strict limits and proper stopping
+    with torch.inference_mode():
+        outputs = model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,  # Strict limit
+            temperature=0.7,
+            do_sample=True,
+            pad_token_id=tokenizer.pad_token_id,
+            eos_token_id=stop_ids,  # Stop on EOS or <|im_end|>
+            stopping_criteria=StoppingCriteriaList([StopOnTokens(stop_ids)]),
+            use_cache=True,
+            past_key_values=kv_cache,
+        )
+
+    prompt_len = inputs["input_ids"].shape[-1]
+    return list(outputs[:, prompt_len:])
+
+
+def generate_vllm(formatted_inputs, stop_ids):
+    """Generate all prompts with vLLM, returning the new tokens per prompt"""
+    from vllm import LLM, SamplingParams
+
+    llm = LLM(model=MODEL_PATH, dtype="float16", gpu_memory_utilization=0.9, max_model_len=2048)
+    sampling_params = SamplingParams(
+        temperature=0.7,
+        max_tokens=MAX_NEW_TOKENS,
+        stop_token_ids=stop_ids,
+        skip_special_tokens=False,
+    )
+    outputs = llm.generate(formatted_inputs, sampling_params)
+    return [torch.tensor(output.outputs[0].token_ids) for output in outputs]
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    print(f"Loading tokenizer{' and model' if args.backend == 'hf' else ''}...")
+    tokenizer = load_tokenizer(MODEL_PATH)
+    draft_model = None
+    if args.backend == "hf":
+        print(f"Quantization: {args.quant}")
+        model = load_hf_model(args.quant)
+        if args.draft_model:
+            print(f"Loading draft model for speculative decoding: {args.draft_model}")
+            draft_model = load_model(args.draft_model, torch_dtype=torch.float16, device_map="auto")
+
+    with buffered_output():
+        print("\n" + "="*80)
+        print("TOKENIZER DIAGNOSTICS:")
+        print("="*80)
+        print(f"EOS token: {tokenizer.eos_token} (ID: {tokenizer.eos_token_id})")
+        print(f"BOS token: {tokenizer.bos_token} (ID: {tokenizer.bos_token_id})")
+        print(f"PAD token: {tokenizer.pad_token} (ID: {tokenizer.pad_token_id})")
+        print(f"Chat template exists: {tokenizer.chat_template is not None}")
+
+        # Check if im_end token exists
+        im_end_id = tokenizer.convert_tokens_to_ids("<|im_end|>")
+        print(f"<|im_end|> token ID: {im_end_id}")
+
+        # Qwen ends a turn with <|im_end|>, which may differ from eos_token_id
+        stop_ids = [i for i in {tokenizer.eos_token_id, im_end_id} if i is not None]
+        print(f"Stop token IDs: {stop_ids}")
+
+        print("\n" + "="*80)
+        print(f"GENERATION TEST ({len(PROBE_PROMPTS)} prompts, batched, {args.backend} backend):")
+        print("="*80)
+
+        formatted_inputs = tokenizer.apply_chat_template(
+            [[{"role": "user", "content": prompt}] for prompt in PROBE_PROMPTS],
+            tokenize=False,
+            add_generation_prompt=True,
+        )
+
+        print(f"Input (first prompt):\n{formatted_inputs[0]}\n")
+
+    if args.compile and args.backend == "hf" and draft_model is None and not args.fail_fast:
+        # The static KV cache keeps decode shapes fixed, so the step can be
+        # captured as a CUDA graph; a short warm-up run triggers the capture
+        print("Compiling decode step (torch.compile, reduce-overhead)...")
+        model.forward = torch.compile(model.forward, mode="reduce-overhead", fullgraph=True, dynamic=False)
+        generate_hf(model, tokenizer, formatted_inputs, stop_ids, max_new_tokens=2)
+
+    print(f"Generating (max {MAX_NEW_TOKENS} tokens)...")
+    start_time = time.time()
+
+    if args.backend == "vllm":
+        new_token_rows = generate_vllm(formatted_inputs, stop_ids)
+    elif draft_model is not None:
+        new_token_rows = generate_assisted(model, draft_model, tokenizer, formatted_inputs, stop_ids)
+    elif args.fail_fast:
+        new_token_rows = generate_streaming(model, tokenizer, formatted_inputs, stop_ids)
+    else:
+        new_token_rows = generate_hf(model, tokenizer, formatted_inputs, stop_ids)
+
+    elapsed = time.time() - start_time
+    print(f"Generation took {elapsed:.2f} seconds")
+
+    with buffered_output():
+        # Token checks stay on the generation device instead of copying ids to Python lists
+        stop_id_tensor = torch.tensor(stop_ids, device=new_token_rows[0].device)
+
+        stopped_count = 0
+        for prompt, formatted_input, new_tokens in zip(PROBE_PROMPTS, formatted_inputs, new_token_rows):
+            # Decode only the new tokens; the prompt is already known
+            decoded_new = tokenizer.decode(new_tokens, skip_special_tokens=False)
+            response = formatted_input + decoded_new
+
+            print("\n" + "="*80)
+            print(f"OUTPUT for {prompt!r} (with special tokens):")
+            print("="*80)
+            print(response)
+
+            print("\n" + "="*80)
+            print("ANALYSIS:")
+            print("="*80)
+
+            # Count tokens (HF rows that finished early are padded, so stop at the first stop token)
+            stop_positions = torch.isin(new_tokens, stop_id_tensor).nonzero()
+            print(f"Generated {int(stop_positions[0]) + 1 if len(stop_positions) else new_tokens.numel()} tokens")
+
+            # Check if it hit EOS (vLLM may leave the stop token out of its output)
+            if len(stop_positions) or new_tokens.numel() < MAX_NEW_TOKENS:
+                stopped_count += 1
+                print("✓ Model generated a stop token (stopped naturally)")
+            else:
+                print("❌ Model did NOT generate EOS token (hit max_new_tokens limit)")
+                print("   This means the model doesn't know when to stop!")
+
+            # Check if it generated im_end
+            if bool((new_tokens == im_end_id).any()):
+                print("✓ Model generated <|im_end|> token")
+            else:
+                print("❌ Model did NOT generate <|im_end|> token")
+
+            # Check for hallucination markers in just the new tokens
+            found = sorted(set(HALLUCINATION_PATTERN.findall(decoded_new)), key=HALLUCINATION_MARKERS.index)
+            if found:
+                print(f"❌ HALLUCINATIONS FOUND: {found}")
+            else:
+                print("✓ No hallucinations in generated tokens")
+
+        print("\n" + "="*80)
+        print("DIAGNOSIS:")
+        print("="*80)
+
+        print(f"{stopped_count}/{len(PROBE_PROMPTS)} prompts generated a stop token")
+        if stopped_count == len(PROBE_PROMPTS):
+            print("Model CAN stop properly. Problem might be:")
+            print("  - LM Studio not respecting EOS token")
+            print("  - Max tokens set too high in LM Studio")
+        else:
+            print("Model CANNOT stop properly. Root causes:")
+            print("  1. EOS token not trained correctly")
+            print("  2. Chat template issue during training")
+            print("  3. Training data didn't include proper endings")
+            print("\nFIX: Need to retrain with correct EOS token handling")
+
+
+if __name__ == "__main__":
+    main()
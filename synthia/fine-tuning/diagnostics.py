@@ -0,0 +1,102 @@
+"""
+Shared helpers for the diagnostic scripts
+(check_qwen_template.py, diagnose_training.py, diagnose_generation_loop.py, diagnose.py)
+and the training/test scripts that need the official chat template
+"""
+import contextlib
+import functools
+import io
+import os
+import sys
+
+# Hub tokenizers are saved here after the first load so later runs read the
+# local fast-tokenizer files instead of going back to the HF Hub
+TOKENIZER_CACHE_DIR = ".tokenizer_cache"
+
+# The official Qwen2.5-Coder chat template, written out on first use so later
+# runs don't load the full Hub tokenizer just to read one string
+OFFICIAL_TEMPLATE_MODEL = "Qwen/Qwen2.5-Coder-7B-Instruct"
+CHAT_TEMPLATE_CACHE = "data/qwen_chat_template.jinja"
+
+
+@functools.lru_cache(maxsize=2)
+def load_tokenizer(name_or_path):
+    """Load a fast tokenizer once per process, via the local cache for Hub models"""
+    from transformers import AutoTokenizer
+
+    if os.path.isdir(name_or_path):
+        return AutoTokenizer.from_pretrained(name_or_path, use_fast=True)
+
+    cache_path = os.path.join(TOKENIZER_CACHE_DIR, name_or_path.replace("/", "--"))
+    if os.path.isdir(cache_path):
+        return AutoTokenizer.from_pretrained(cache_path, use_fast=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(name_or_path, use_fast=True)
+    tokenizer.save_pretrained(cache_path)
+    return tokenizer
+
+
+def load_official_chat_template():
+    """Return the official Qwen2.5-Coder chat template, from the local copy when present"""
+    if not os.path.exists(CHAT_TEMPLATE_CACHE):
+        from transformers import AutoTokenizer
+
+        template = AutoTokenizer.from_pretrained(OFFICIAL_TEMPLATE_MODEL).chat_template
+        os.makedirs(os.path.dirname(CHAT_TEMPLATE_CACHE), exist_ok=True)
+        with open(CHAT_TEMPLATE_CACHE, "w", encoding="utf-8") as f:
+            f.write(template)
+        return template
+
+    with open(CHAT_TEMPLATE_CACHE, encoding="utf-8") as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=2)
+def load_model(name_or_path, quant="none", **kwargs):
+    """Load a causal LM once per process
+
+    quant is "none", "int8" or "nf4" (bitsandbytes); other kwargs are passed
+    to from_pretrained.
+    """
+    import torch
+    from transformers import AutoModelForCausalLM, BitsAndBytesConfig
+
+    if quant == "nf4":
+        kwargs["quantization_config"] = BitsAndBytesConfig(
+            load_in_4bit=True,
+            bnb_4bit_compute_dtype=torch.float16,
+            bnb_4bit_quant_type="nf4",
+            bnb_4bit_use_double_quant=True,
+        )
+        kwargs.pop("torch_dtype", None)
+    elif quant == "int8":
+        kwargs["quantization_config"] = BitsAndBytesConfig(load_in_8bit=True)
+        kwargs.pop("torch_dtype", None)
+    elif quant != "none":
+        raise ValueError(f"Unknown quantization: {quant}")
+
+    return AutoModelForCausalLM.from_pretrained(name_or_path, **kwargs)
+
+
+def load_model_fast_attention(name_or_path, quant="none", **kwargs):
+    """load_model with FlashAttention-2, falling back to SDPA when it isn't available"""
+    try:
+        model = load_model(name_or_path, quant=quant, attn_implementation="flash_attention_2", **kwargs)
+    except (ImportError, ValueError) as e:
+        # flash-attn not installed or GPU not supported
+        print(f"FlashAttention-2 unavailable ({e}), falling back to SDPA")
+        model = load_model(name_or_path, quant=quant, attn_implementation="sdpa", **kwargs)
+    print(f"Attention implementation: {model.config._attn_implementation}")
+    return model
+
+
+@contextlib.contextmanager
+def buffered_output():
+    """Collect everything printed in the block and write it to stdout in one call"""
+    buffer = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(buffer):
+            yield
+    finally:
+        sys.stdout.write(buffer.getvalue())
+        sys.stdout.flush()
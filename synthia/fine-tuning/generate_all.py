@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Run all dataset generators concurrently, one process per script.
+
+Each generator writes its own output file, so they are independent and the
+build takes as long as the slowest script instead of the sum of all of them.
+"""
+
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+GENERATORS = [
+    "generate_dataset.py",
+    "generate_failure_recovery.py",
+    "generate_flask_examples.py",
+]
+
+def run_generator(script):
+    """Run one generator script in its own interpreter and return its name and runtime."""
+    start = time.perf_counter()
+    # A separate (non-daemonic) process, so a generator can start its own
+    # worker pool - generate_dataset.py does for more than one chunk
+    subprocess.run([sys.executable, os.path.join(SCRIPT_DIR, script)], check=True)
+    return script, time.perf_counter() - start
+
+def main():
+    start = time.perf_counter()
+    processes = min(len(GENERATORS), os.cpu_count() or 1)
+
+    # The threads only wait on the child processes
+    with ThreadPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(run_generator, script) for script in GENERATORS]
+        for future in as_completed(futures):
+            script, elapsed = future.result()
+            print(f"✓ {script} finished in {elapsed:.2f}s")
+
+    print(f"\n✓ All {len(GENERATORS)} generators finished in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
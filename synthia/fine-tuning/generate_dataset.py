@@ -7,17 +7,28 @@ to use Synthia's tools proactively.
 import json
 import random
 import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import fastjsonschema
+import orjson
+
+# Seeded so the same DATASET_SEED always produces the same dataset
+rng = random.Random(int(os.environ.get("DATASET_SEED", "0")))
+
+# Pre-serialized tool call; orjson.Fragment embeds it verbatim at write time
+TOOL_CALL_TEMPLATE = b'{"id":%b,"type":"function","function":{"name":%b,"arguments":%b}}'
 
 def create_tool_call(tool_id, name, arguments_dict):
-    """Create a tool call structure."""
-    return {
-        "id": tool_id,
-        "type": "function",
-        "function": {
-            "name": name,
-            "arguments": json.dumps(arguments_dict)
-        }
-    }
+    """Create a tool call structure (already serialized to JSON)."""
+    return orjson.Fragment(TOOL_CALL_TEMPLATE % (
+        orjson.dumps(tool_id),
+        orjson.dumps(name),
+        orjson.dumps(json.dumps(arguments_dict)),
+    ))
+
+# Tool calls shared by more than one example are built once and referenced
+READ_CONFIG_CALL = create_tool_call("call_1", "read", {"file_path": "/app/config.json"})
 
 # ============================================================================
 # BASH TOOL EXAMPLES
@@ -150,17 +161,21 @@ bash_commands = [
     ("curl -I https://api.example.com", "Check API status", "HTTP/2 200\ndate: Mon, 15 Jan 2024 10:00:00 GMT\ncontent-type: application/json"),
 ]
 
+# Same closing message for every generated example, shared by reference
+bash_results_message = {"role": "assistant", "content": "Here are the results."}
+
 for cmd, desc, output in bash_commands:
+    desc_lower = desc.lower()
     bash_examples.append({
         "messages": [
-            {"role": "user", "content": f"Can you {desc.lower()}?"},
+            {"role": "user", "content": f"Can you {desc_lower}?"},
             {
                 "role": "assistant",
-                "content": f"I'll {desc.lower()}.",
+                "content": f"I'll {desc_lower}.",
                 "tool_calls": [create_tool_call("call_1", "bash", {"command": cmd, "description": desc})]
             },
             {"role": "tool", "tool_call_id": "call_1", "name": "bash", "content": output},
-            {"role": "assistant", "content": f"Here are the results."}
+            bash_results_message
         ]
     })
 
@@ -175,7 +190,7 @@ read_examples = [
             {
                 "role": "assistant",
                 "content": "I'll read the config file for you.",
-                "tool_calls": [create_tool_call("call_1", "read", {"file_path": "/app/config.json"})]
+                "tool_calls": [READ_CONFIG_CALL]
             },
             {"role": "tool", "tool_call_id": "call_1", "name": "read", "content": '{\n  "port": 3000,\n  "database": {\n    "host": "localhost",\n    "port": 5432,\n    "name": "mydb"\n  },\n  "logging": {\n    "level": "info"\n  }\n}'},
             {"role": "assistant", "content": "The config file shows:\n- Server running on port 3000\n- Database: localhost:5432 (mydb)\n- Logging level: info"}
@@ -312,7 +327,7 @@ write_edit_examples = [
             {
                 "role": "assistant",
                 "content": "Let me read the config first.",
-                "tool_calls": [create_tool_call("call_1", "read", {"file_path": "/app/config.json"})]
+                "tool_calls": [READ_CONFIG_CALL]
             },
             {"role": "tool", "tool_call_id": "call_1", "name": "read", "content": '{\n  "port": 3000,\n  "env": "development"\n}'},
             {
@@ -471,45 +486,159 @@ complex_examples = [
 # ASSEMBLE AND WRITE DATASET
 # ============================================================================
 
-# Collect all examples
-all_examples = []
-all_examples.extend(bash_examples * 4)  # Bash is 25%
-all_examples.extend(read_examples * 3)  # Read is 20%
-all_examples.extend(grep_glob_examples * 3)  # Grep/glob is 15%
-all_examples.extend(write_edit_examples * 3)  # Write/edit is 15%
-all_examples.extend(git_examples * 2)  # Git is 10%
-all_examples.extend(powertools_examples * 2)  # Powertools is 8%
-all_examples.extend(webfetch_examples * 2)  # Webfetch is 4%
-all_examples.extend(workshop_examples * 2)  # Workshop is 3%
-all_examples.extend(complex_examples * 4)  # Complex is 20%
-
-# Shuffle for variety
-random.shuffle(all_examples)
-
-# Limit to 250 examples
-all_examples = all_examples[:250]
-
-# Print statistics
-tool_counts = {}
-for example in all_examples:
-    for message in example["messages"]:
-        if "tool_calls" in message:
-            for tool_call in message["tool_calls"]:
-                tool_name = tool_call["function"]["name"]
-                tool_counts[tool_name] = tool_counts.get(tool_name, 0) + 1
-
-print(f"Generating {len(all_examples)} training examples...")
-print("\nTool distribution:")
-for tool, count in sorted(tool_counts.items(), key=lambda x: x[1], reverse=True):
-    print(f"  {tool}: {count} calls")
-
-# Write JSONL file
-output_path = "/Users/zachswift/projects/agent-power-tools/synthia/fine-tuning/dataset.jsonl"
-with open(output_path, "w") as f:
-    for example in all_examples:
-        f.write(json.dumps({"messages": example["messages"]}) + "\n")
-
-file_size = os.path.getsize(output_path)
-print(f"\nDataset written to: {output_path}")
-print(f"Total examples: {len(all_examples)}")
-print(f"File size: {file_size / 1024 / 1024:.2f} MB")
+# (examples, copies) - copies is how many times each example is repeated before shuffling
+EXAMPLE_GROUPS = [
+    (bash_examples, 4),  # Bash is 25%
+    (read_examples, 3),  # Read is 20%
+    (grep_glob_examples, 3),  # Grep/glob is 15%
+    (write_edit_examples, 3),  # Write/edit is 15%
+    (git_examples, 2),  # Git is 10%
+    (powertools_examples, 2),  # Powertools is 8%
+    (webfetch_examples, 2),  # Webfetch is 4%
+    (workshop_examples, 2),  # Workshop is 3%
+    (complex_examples, 4),  # Complex is 20%
+]
+
+# Every unique example, in a fixed order. Worker processes rebuild the same
+# list when they import this module, so only indices cross process boundaries
+# (the pre-serialized tool calls can't be pickled).
+EXAMPLE_POOL = [example for examples, _ in EXAMPLE_GROUPS for example in examples]
+
+MAX_EXAMPLES = 250
+CHUNK_SIZE = 4096  # Examples per worker task
+OUTPUT_PATH = "/Users/zachswift/projects/agent-power-tools/synthia/fine-tuning/dataset.jsonl"
+
+# Shape of one JSONL record, checked against the written file
+EXAMPLE_SCHEMA = {
+    "type": "object",
+    "required": ["messages"],
+    "properties": {
+        "messages": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["role", "content"],
+                "properties": {
+                    "role": {"enum": ["system", "user", "assistant", "tool"]},
+                    "content": {"type": "string"},
+                    "tool_call_id": {"type": "string"},
+                    "name": {"type": "string"},
+                    "tool_calls": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "required": ["id", "type", "function"],
+                            "properties": {
+                                "id": {"type": "string"},
+                                "type": {"const": "function"},
+                                "function": {
+                                    "type": "object",
+                                    "required": ["name", "arguments"],
+                                    "properties": {
+                                        "name": {"type": "string"},
+                                        "arguments": {"type": "string"},
+                                    },
+                                },
+                            },
+                        },
+                    },
+                },
+            },
+        },
+    },
+}
+
+def category_targets():
+    """How many slots each category in EXAMPLE_GROUPS gets (sums to at most MAX_EXAMPLES)."""
+    weighted = [len(examples) * copies for examples, copies in EXAMPLE_GROUPS]
+    total = sum(weighted)
+    if total <= MAX_EXAMPLES:
+        return weighted
+
+    # Scale every category down by the same factor, then hand the slots lost
+    # to rounding down to the categories with the largest fractional parts
+    shares = [count * MAX_EXAMPLES / total for count in weighted]
+    targets = [int(share) for share in shares]
+    by_fraction = sorted(range(len(shares)), key=lambda i: shares[i] - targets[i], reverse=True)
+    for i in by_fraction[:MAX_EXAMPLES - sum(targets)]:
+        targets[i] += 1
+    return targets
+
+def build_example_indices():
+    """Weighted, shuffled indices into EXAMPLE_POOL (at most MAX_EXAMPLES)."""
+    indices = []
+    offset = 0
+    for (examples, _), target in zip(EXAMPLE_GROUPS, category_targets()):
+        # Every example gets full_copies slots; the remainder is drawn without replacement
+        full_copies, remainder = divmod(target, len(examples))
+        category_indices = range(offset, offset + len(examples))
+        indices.extend(list(category_indices) * full_copies)
+        indices.extend(rng.sample(category_indices, remainder))
+        offset += len(examples)
+
+    # Shuffle for variety
+    rng.shuffle(indices)
+    return indices
+
+def encode_chunk(indices):
+    """Serialize a chunk of examples to JSONL bytes."""
+    return b"".join(orjson.dumps({"messages": EXAMPLE_POOL[i]["messages"]}) + b"\n" for i in indices)
+
+def validate_output(path):
+    """Check every written record against EXAMPLE_SCHEMA; returns the record count."""
+    validate = fastjsonschema.compile(EXAMPLE_SCHEMA)
+    count = 0
+    with open(path, "rb") as f:
+        for line_number, line in enumerate(f, 1):
+            try:
+                validate(orjson.loads(line))
+            except (orjson.JSONDecodeError, fastjsonschema.JsonSchemaException) as e:
+                raise ValueError(f"{path}:{line_number}: invalid example: {e}") from e
+            count += 1
+    return count
+
+def main():
+    indices = build_example_indices()
+    print(f"Generating {len(indices)} training examples...")
+
+    # Write JSONL file chunk by chunk, encoding chunks in parallel when there
+    # is more than one, and count how often each example was written
+    chunks = [indices[i:i + CHUNK_SIZE] for i in range(0, len(indices), CHUNK_SIZE)]
+    picks = Counter()
+    file_size = 0
+    with open(OUTPUT_PATH, "wb", buffering=1 << 20) as f:
+        if len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+                for chunk, blob in zip(chunks, executor.map(encode_chunk, chunks)):
+                    file_size += f.write(blob)
+                    picks.update(chunk)
+        else:
+            for chunk in chunks:
+                file_size += f.write(encode_chunk(chunk))
+                picks.update(chunk)
+
+    # Print statistics (tool calls are pre-serialized, so count their tool responses).
+    # Repeats share the same dicts, so walk each unique example once and
+    # weight it by how many times it was written.
+    tool_counts = Counter()
+    for index, occurrences in picks.items():
+        example_counts = Counter(
+            message["name"] for message in EXAMPLE_POOL[index]["messages"] if message["role"] == "tool"
+        )
+        tool_counts.update({tool: count * occurrences for tool, count in example_counts.items()})
+
+    print("\nTool distribution:")
+    for tool, count in tool_counts.most_common():
+        print(f"  {tool}: {count} calls")
+
+    # Tool calls are written from pre-serialized fragments, so check the result
+    valid_count = validate_output(OUTPUT_PATH)
+    print(f"\n✓ All {valid_count} examples match the dataset schema")
+
+    print(f"\nDataset written to: {OUTPUT_PATH}")
+    print(f"Total examples: {len(indices)}")
+    print(f"File size: {file_size / 1024 / 1024:.2f} MB")
+
+if __name__ == "__main__":
+    main()
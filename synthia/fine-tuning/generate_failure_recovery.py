@@ -7,8 +7,14 @@ Generate tool failure recovery examples to teach the model to:
 """
 
 import json
+import os
 import random
 
+import orjson
+
+# Seeded so the same DATASET_SEED always produces the same dataset
+rng = random.Random(int(os.environ.get("DATASET_SEED", "0")))
+
 def create_tool_call(tool_id, name, arguments_dict):
     """Create a tool call structure."""
     return {
@@ -20,6 +26,25 @@ def create_tool_call(tool_id, name, arguments_dict):
         }
     }
 
+def _make_recovery_example(user_request, steps, final_message):
+    """Build a recovery conversation shared by all failure patterns.
+
+    Each step is (assistant_content, tool_name, arguments_dict, tool_result) and
+    becomes an assistant tool call plus its tool response; the final assistant
+    message closes the conversation.
+    """
+    messages = [{"role": "user", "content": user_request}]
+    for number, (content, tool_name, arguments, result) in enumerate(steps, 1):
+        call_id = f"call_{number}"
+        messages.append({
+            "role": "assistant",
+            "content": content,
+            "tool_calls": [create_tool_call(call_id, tool_name, arguments)]
+        })
+        messages.append({"role": "tool", "tool_call_id": call_id, "name": tool_name, "content": result})
+    messages.append({"role": "assistant", "content": final_message})
+    return {"messages": messages}
+
 # ============================================================================
 # PATTERN 1: Wrong package manager - switch to correct one
 # ============================================================================
@@ -96,36 +121,16 @@ def generate_package_manager_examples():
     examples = []
 
     for scenario in package_manager_failures:
-        example = {
-            "messages": [
-                {"role": "user", "content": scenario["user_request"]},
-                {
-                    "role": "assistant",
-                    "content": f"I'll {scenario['wrong_desc'].lower()}.",
-                    "tool_calls": [create_tool_call("call_1", scenario["wrong_tool"],
-                        {"command": scenario["wrong_command"], "description": scenario["wrong_desc"]})]
-                },
-                {"role": "tool", "tool_call_id": "call_1", "name": scenario["wrong_tool"],
-                 "content": f"stdout:\n\nstderr:\n{scenario['error']}"},
-                {
-                    "role": "assistant",
-                    "content": scenario["analysis"],
-                    "tool_calls": [create_tool_call("call_2", scenario["discovery_tool"], scenario["discovery_args"])]
-                },
-                {"role": "tool", "tool_call_id": "call_2", "name": scenario["discovery_tool"],
-                 "content": scenario["discovery_result"]},
-                {
-                    "role": "assistant",
-                    "content": f"I'll use {scenario['correct_command']} instead.",
-                    "tool_calls": [create_tool_call("call_3", scenario["correct_tool"],
-                        {"command": scenario["correct_command"], "description": scenario["correct_desc"]})]
-                },
-                {"role": "tool", "tool_call_id": "call_3", "name": scenario["correct_tool"],
-                 "content": f"stdout:\n{scenario['success']}\n\nstderr:\n"},
-                {"role": "assistant", "content": scenario["final_message"]}
-            ]
-        }
-        examples.append(example)
+        examples.append(_make_recovery_example(scenario["user_request"], [
+            (f"I'll {scenario['wrong_desc'].lower()}.", scenario["wrong_tool"],
+             {"command": scenario["wrong_command"], "description": scenario["wrong_desc"]},
+             f"stdout:\n\nstderr:\n{scenario['error']}"),
+            (scenario["analysis"], scenario["discovery_tool"], scenario["discovery_args"],
+             scenario["discovery_result"]),
+            (f"I'll use {scenario['correct_command']} instead.", scenario["correct_tool"],
+             {"command": scenario["correct_command"], "description": scenario["correct_desc"]},
+             f"stdout:\n{scenario['success']}\n\nstderr:\n"),
+        ], scenario["final_message"]))
 
     return examples
 
@@ -165,34 +170,14 @@ def generate_file_not_found_examples():
     examples = []
 
     for scenario in file_not_found_scenarios:
-        example = {
-            "messages": [
-                {"role": "user", "content": scenario["user_request"]},
-                {
-                    "role": "assistant",
-                    "content": f"I'll read {scenario['wrong_path']}.",
-                    "tool_calls": [create_tool_call("call_1", "read", {"file_path": scenario["wrong_path"]})]
-                },
-                {"role": "tool", "tool_call_id": "call_1", "name": "read",
-                 "content": scenario["error"]},
-                {
-                    "role": "assistant",
-                    "content": scenario["analysis"],
-                    "tool_calls": [create_tool_call("call_2", scenario["discovery_tool"], scenario["discovery_args"])]
-                },
-                {"role": "tool", "tool_call_id": "call_2", "name": scenario["discovery_tool"],
-                 "content": scenario["discovery_result"]},
-                {
-                    "role": "assistant",
-                    "content": f"Let me read {scenario['correct_path']} instead.",
-                    "tool_calls": [create_tool_call("call_3", "read", {"file_path": scenario["correct_path"]})]
-                },
-                {"role": "tool", "tool_call_id": "call_3", "name": "read",
-                 "content": scenario["file_content"]},
-                {"role": "assistant", "content": scenario["final_message"]}
-            ]
-        }
-        examples.append(example)
+        examples.append(_make_recovery_example(scenario["user_request"], [
+            (f"I'll read {scenario['wrong_path']}.", "read", {"file_path": scenario["wrong_path"]},
+             scenario["error"]),
+            (scenario["analysis"], scenario["discovery_tool"], scenario["discovery_args"],
+             scenario["discovery_result"]),
+            (f"Let me read {scenario['correct_path']} instead.", "read", {"file_path": scenario["correct_path"]},
+             scenario["file_content"]),
+        ], scenario["final_message"]))
 
     return examples
 
@@ -228,29 +213,14 @@ def generate_permission_denied_examples():
     examples = []
 
     for scenario in permission_denied_scenarios:
-        example = {
-            "messages": [
-                {"role": "user", "content": scenario["user_request"]},
-                {
-                    "role": "assistant",
-                    "content": f"I'll run {scenario['wrong_command']}.",
-                    "tool_calls": [create_tool_call("call_1", "bash",
-                        {"command": scenario["wrong_command"], "description": scenario["user_request"]})]
-                },
-                {"role": "tool", "tool_call_id": "call_1", "name": "bash",
-                 "content": f"stdout:\n\nstderr:\n{scenario['error']}"},
-                {
-                    "role": "assistant",
-                    "content": scenario["analysis"],
-                    "tool_calls": [create_tool_call("call_2", "bash",
-                        {"command": scenario["correct_command"], "description": scenario["correct_desc"]})]
-                },
-                {"role": "tool", "tool_call_id": "call_2", "name": "bash",
-                 "content": f"stdout:\n{scenario['success']}\n\nstderr:\n"},
-                {"role": "assistant", "content": scenario["final_message"]}
-            ]
-        }
-        examples.append(example)
+        examples.append(_make_recovery_example(scenario["user_request"], [
+            (f"I'll run {scenario['wrong_command']}.", "bash",
+             {"command": scenario["wrong_command"], "description": scenario["user_request"]},
+             f"stdout:\n\nstderr:\n{scenario['error']}"),
+            (scenario["analysis"], "bash",
+             {"command": scenario["correct_command"], "description": scenario["correct_desc"]},
+             f"stdout:\n{scenario['success']}\n\nstderr:\n"),
+        ], scenario["final_message"]))
 
     return examples
 
@@ -286,29 +256,14 @@ def generate_command_not_found_examples():
     examples = []
 
     for scenario in command_not_found_scenarios:
-        example = {
-            "messages": [
-                {"role": "user", "content": scenario["user_request"]},
-                {
-                    "role": "assistant",
-                    "content": f"I'll use {scenario['wrong_command']}.",
-                    "tool_calls": [create_tool_call("call_1", "bash",
-                        {"command": scenario["wrong_command"], "description": scenario["user_request"]})]
-                },
-                {"role": "tool", "tool_call_id": "call_1", "name": "bash",
-                 "content": f"stdout:\n\nstderr:\n{scenario['error']}"},
-                {
-                    "role": "assistant",
-                    "content": scenario["analysis"],
-                    "tool_calls": [create_tool_call("call_2", "bash",
-                        {"command": scenario["correct_command"], "description": scenario["correct_desc"]})]
-                },
-                {"role": "tool", "tool_call_id": "call_2", "name": "bash",
-                 "content": f"stdout:\n{scenario['success']}\n\nstderr:\n"},
-                {"role": "assistant", "content": scenario["final_message"]}
-            ]
-        }
-        examples.append(example)
+        examples.append(_make_recovery_example(scenario["user_request"], [
+            (f"I'll use {scenario['wrong_command']}.", "bash",
+             {"command": scenario["wrong_command"], "description": scenario["user_request"]},
+             f"stdout:\n\nstderr:\n{scenario['error']}"),
+            (scenario["analysis"], "bash",
+             {"command": scenario["correct_command"], "description": scenario["correct_desc"]},
+             f"stdout:\n{scenario['success']}\n\nstderr:\n"),
+        ], scenario["final_message"]))
 
     return examples
 
@@ -330,14 +285,16 @@ def generate_all_failure_recovery_examples():
     base_count = len(examples)
     print(f"Base examples: {base_count}")
 
-    # Repeat with variations to reach ~300 examples
+    # Repeat to reach 300 examples: every example gets full_copies slots and
+    # the remainder is drawn without replacement, so nothing is built and
+    # then truncated
     target = 300
-    multiplier = target // base_count
+    full_copies, remainder = divmod(target, base_count)
 
-    all_examples = examples * multiplier
-    random.shuffle(all_examples)
+    all_examples = examples * full_copies + rng.sample(examples, remainder)
+    rng.shuffle(all_examples)
 
-    return all_examples[:target]
+    return all_examples
 
 if __name__ == "__main__":
     examples = generate_all_failure_recovery_examples()
@@ -346,8 +303,8 @@ if __name__ == "__main__":
 
     # Write to JSONL
     output_path = "/Users/zachswift/projects/agent-power-tools/synthia/fine-tuning/data/failure_recovery.jsonl"
-    with open(output_path, "w") as f:
+    with open(output_path, "wb", buffering=1 << 20) as f:
         for example in examples:
-            f.write(json.dumps(example) + "\n")
+            f.write(orjson.dumps(example) + b"\n")
 
     print(f"Written to: {output_path}")
@@ -8,8 +8,18 @@ Generate Flask + Jinja2 template CRUD examples to teach the model:
 """
 
 import json
+import os
 import random
 
+import orjson
+from jinja2 import Environment, TemplateSyntaxError
+
+# Seeded so the same DATASET_SEED always produces the same dataset
+rng = random.Random(int(os.environ.get("DATASET_SEED", "0")))
+
+# Only used to parse the example templates, never to render them
+TEMPLATE_ENV = Environment(auto_reload=False)
+
 def create_tool_call(tool_id, name, arguments_dict):
     """Create a tool call structure."""
     return {
@@ -413,53 +423,62 @@ wrong_tech_stack_example = {
 }
 
 # ============================================================================
-# GENERATE ALL EXAMPLES
+# TEMPLATE SYNTAX CHECK
 # ============================================================================
 
-def generate_all_flask_examples():
-    """Generate Flask + Jinja2 template examples."""
-    examples = []
-
-    # Add main examples
-    examples.append(flask_todo_crud)
-    examples.append(flask_blog_create)
-    examples.append(wrong_tech_stack_example)
+def check_templates(examples):
+    """Parse every .html file the examples write, once per unique template."""
+    seen = set()
+    for example in examples:
+        for message in example["messages"]:
+            for tool_call in message.get("tool_calls", []):
+                if tool_call["function"]["name"] != "write":
+                    continue
+                arguments = json.loads(tool_call["function"]["arguments"])
+                if not arguments["file_path"].endswith(".html") or arguments["content"] in seen:
+                    continue
+                try:
+                    TEMPLATE_ENV.parse(arguments["content"])
+                except TemplateSyntaxError as e:
+                    raise ValueError(f"{arguments['file_path']}: invalid Jinja2 template: {e}") from e
+                seen.add(arguments["content"])
+    return len(seen)
 
-    # Create variations with different CRUD operations
-    variations = []
-
-    # TODO list variations
-    for i in range(5):
-        variations.append({
-            "messages": flask_todo_crud["messages"]
-        })
+# ============================================================================
+# GENERATE ALL EXAMPLES
+# ============================================================================
 
-    # Blog variations
-    for i in range(3):
-        variations.append({
-            "messages": flask_blog_create["messages"]
-        })
+# Each unique example and how many times it appears in the dataset
+UNIQUE_EXAMPLES = {
+    "todo": flask_todo_crud,
+    "blog": flask_blog_create,
+    "wrong_stack": wrong_tech_stack_example,
+}
+EXAMPLE_COUNTS = {"todo": 6, "blog": 4, "wrong_stack": 4}
 
-    # Wrong tech stack variations
-    for i in range(3):
-        variations.append({
-            "messages": wrong_tech_stack_example["messages"]
-        })
+def generate_all_flask_examples():
+    """Generate the shuffled order of Flask + Jinja2 examples as keys into UNIQUE_EXAMPLES."""
+    order = [key for key, count in EXAMPLE_COUNTS.items() for _ in range(count)]
+    rng.shuffle(order)
+    return order
 
-    examples.extend(variations)
+if __name__ == "__main__":
+    order = generate_all_flask_examples()
 
-    random.shuffle(examples)
-    return examples
+    print(f"Generated {len(order)} Flask/Jinja2 examples")
 
-if __name__ == "__main__":
-    examples = generate_all_flask_examples()
+    template_count = check_templates(UNIQUE_EXAMPLES.values())
+    print(f"✓ {template_count} Jinja2 templates parse cleanly")
 
-    print(f"Generated {len(examples)} Flask/Jinja2 examples")
+    # Serialize each unique example once; repeats reuse the same line
+    serialized = {
+        key: orjson.dumps(example, option=orjson.OPT_APPEND_NEWLINE)
+        for key, example in UNIQUE_EXAMPLES.items()
+    }
 
     # Write to JSONL
     output_path = "/Users/zachswift/projects/agent-power-tools/synthia/fine-tuning/data/flask_templates.jsonl"
-    with open(output_path, "w") as f:
-        for example in examples:
-            f.write(json.dumps(example) + "\n")
+    with open(output_path, "wb", buffering=1 << 20) as f:
+        f.writelines(serialized[key] for key in order)
 
     print(f"Written to: {output_path}")
@@ -14,11 +14,16 @@ Expected VRAM usage: ~7-8GB peak during merge
 Expected time: ~10-20 minutes
 """
 
+import gc
 import os
 import shutil
+import subprocess
+import sys
 import torch
+from concurrent.futures import ThreadPoolExecutor
 from unsloth import FastLanguageModel
 from datetime import datetime
+from pathlib import Path
 
 # ============================================================================
 # CONFIGURATION
@@ -34,6 +39,7 @@ OUTPUT_BASE = "./outputs/qwen2.5-coder-synthia-merged"
 EXPORT_16BIT = True  # Export 16-bit merged model
 EXPORT_GGUF = False  # Export GGUF for LM Studio (DISABLED - use convert_to_gguf.sh instead)
 EXPORT_4BIT = False  # Export 4-bit quantized (optional, saves disk space)
+MAX_SHARD_SIZE = "2GB"  # safetensors shard size (7B FP16 = ~7 even shards instead of 3 uneven 5GB ones)
 
 # GGUF quantization methods (lower bits = smaller file, slightly lower quality)
 # Recommended for RTX 4060: Q4_K_M or Q5_K_M
@@ -42,6 +48,10 @@ GGUF_QUANTIZATION_METHODS = [
     "q5_k_m",  # 5-bit, medium quality (better quality)
 ]
 
+# llama.cpp checkout and quantizer, set up by convert_to_gguf.sh
+LLAMA_CPP_DIR = os.path.expanduser("~/llama.cpp")
+LLAMA_QUANTIZE = os.path.join(LLAMA_CPP_DIR, "build", "bin", "llama-quantize")
+
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
@@ -59,51 +69,71 @@ def format_vram(bytes_value):
     """Format bytes to GB"""
     return f"{bytes_value / 1024**3:.2f} GB"
 
+SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
+
 def format_size(bytes_value):
     """Format bytes to human-readable size"""
-    for unit in ['B', 'KB', 'MB', 'GB']:
-        if bytes_value < 1024.0:
-            return f"{bytes_value:.2f} {unit}"
-        bytes_value /= 1024.0
-    return f"{bytes_value:.2f} TB"
+    # Every 10 bits is one unit step (1024x)
+    exponent = min(max(int(bytes_value).bit_length() - 1, 0) // 10, len(SIZE_UNITS) - 1)
+    return f"{bytes_value / (1 << (10 * exponent)):.2f} {SIZE_UNITS[exponent]}"
 
 def print_gpu_memory():
-    """Print current GPU memory usage"""
+    """Print current GPU memory usage and the peak since the last stage boundary"""
     if torch.cuda.is_available():
         allocated = torch.cuda.memory_allocated()
         reserved = torch.cuda.memory_reserved()
-        print(f"GPU Memory: {format_vram(allocated)} allocated, {format_vram(reserved)} reserved")
+        peak = torch.cuda.max_memory_allocated()
+        print(f"GPU Memory: {format_vram(allocated)} allocated, {format_vram(reserved)} reserved, {format_vram(peak)} peak")
     else:
         print("CUDA not available")
 
+def free_gpu_memory():
+    """Release cached VRAM between export stages and start a new peak measurement"""
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+        torch.cuda.ipc_collect()
+        torch.cuda.reset_peak_memory_stats()
+
 def get_directory_size(path):
     """Calculate total size of directory"""
+    # GNU du walks the tree in C; -b gives apparent size in bytes, which BSD
+    # du (macOS) doesn't support, so other platforms use the Python walk
+    if sys.platform.startswith("linux"):
+        try:
+            output = subprocess.run(["du", "-sb", path], check=True, capture_output=True, text=True).stdout
+            return int(output.split()[0])
+        except (OSError, subprocess.CalledProcessError, ValueError, IndexError):
+            pass
+
     total = 0
-    try:
-        for entry in os.scandir(path):
-            if entry.is_file():
-                total += entry.stat().st_size
-            elif entry.is_dir():
-                total += get_directory_size(entry.path)
-    except Exception as e:
-        print(f"Warning: Could not calculate size of {path}: {e}")
+    pending = [path]
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+                    elif entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+        except OSError as e:
+            print(f"Warning: Could not calculate size of {directory}: {e}")
     return total
 
 def verify_lora_adapters(adapter_path):
     """Check if LoRA adapters exist"""
     print_separator("Verifying LoRA Adapters")
 
-    if not os.path.exists(adapter_path):
-        raise FileNotFoundError(f"LoRA adapter path not found: {adapter_path}")
-
-    # Check for required files
+    # Check for required files with one directory listing
     required_files = ["adapter_model.safetensors", "adapter_config.json"]
-    missing_files = []
+    try:
+        with os.scandir(adapter_path) as entries:
+            present = {entry.name for entry in entries if entry.is_file()}
+    except FileNotFoundError:
+        raise FileNotFoundError(f"LoRA adapter path not found: {adapter_path}") from None
 
-    for file in required_files:
-        file_path = os.path.join(adapter_path, file)
-        if not os.path.exists(file_path):
-            missing_files.append(file)
+    missing_files = [file for file in required_files if file not in present]
 
     if missing_files:
         raise FileNotFoundError(
@@ -154,6 +184,8 @@ def merge_and_export_16bit(model, tokenizer, output_path):
         output_path,
         tokenizer,
         save_method="merged_16bit",  # Dequantize to FP16
+        max_shard_size=MAX_SHARD_SIZE,
+        safe_serialization=True,
     )
 
     print(f"✓ Model merged and dequantized to 16-bit")
@@ -165,8 +197,38 @@ def merge_and_export_16bit(model, tokenizer, output_path):
 
     return model
 
-def export_gguf(model, tokenizer, output_base, quantization_methods):
-    """Export model to GGUF format for LM Studio"""
+def quantize_gguf(f16_path, output_path, quant_method):
+    """Quantize an F16 GGUF file with llama-quantize"""
+    subprocess.run(
+        [LLAMA_QUANTIZE, f16_path, output_path, quant_method.upper()],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return output_path
+
+def convert_to_f16_gguf(merged_16bit_path, gguf_dir):
+    """Convert an already-saved 16-bit HF model to an F16 GGUF with llama.cpp"""
+    f16_path = os.path.join(gguf_dir, "model-f16.gguf")
+    subprocess.run(
+        [
+            sys.executable, os.path.join(LLAMA_CPP_DIR, "convert_hf_to_gguf.py"),
+            merged_16bit_path,
+            "--outfile", f16_path,
+            "--outtype", "f16",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return f16_path
+
+def export_gguf(model, tokenizer, output_base, quantization_methods, merged_16bit_path=None):
+    """Export model to GGUF format for LM Studio
+
+    If the 16-bit merged model was already saved, the F16 GGUF is converted
+    from those files; otherwise Unsloth exports it from the in-memory model.
+    """
     print_separator("Exporting GGUF Models")
 
     print("Converting to GGUF format...")
@@ -176,36 +238,58 @@ def export_gguf(model, tokenizer, output_base, quantization_methods):
     gguf_dir = os.path.join(output_base, "gguf")
     os.makedirs(gguf_dir, exist_ok=True)
 
-    for quant_method in quantization_methods:
-        print(f"\n→ Exporting {quant_method.upper()} quantization...")
-
+    # Write the F16 GGUF once; every quantization is made from this file
+    print("→ Exporting F16 GGUF...")
+    if merged_16bit_path is not None:
+        # Reuse the saved safetensors instead of having Unsloth merge and
+        # write another full 16-bit copy just to convert it
         try:
-            # Export to GGUF with specific quantization
-            output_path = os.path.join(gguf_dir, f"model-{quant_method}.gguf")
-
-            # Use Unsloth's GGUF export
-            model.save_pretrained_gguf(
-                gguf_dir,
-                tokenizer,
-                quantization_method=quant_method,
-            )
-
-            # Find the generated file (Unsloth adds suffix)
-            gguf_files = [f for f in os.listdir(gguf_dir) if f.endswith(f"{quant_method}.gguf")]
-
-            if gguf_files:
-                gguf_file = os.path.join(gguf_dir, gguf_files[0])
-                if os.path.exists(gguf_file):
-                    file_size = os.path.getsize(gguf_file)
-                    print(f"  ✓ Saved: {gguf_files[0]}")
-                    print(f"  ✓ Size: {format_size(file_size)}")
-                else:
-                    print(f"  ✗ File not found: {gguf_file}")
-            else:
-                print(f"  ✗ GGUF file not generated")
-
+            f16_path = convert_to_f16_gguf(merged_16bit_path, gguf_dir)
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"  ✗ Error converting {merged_16bit_path} to F16 GGUF: {getattr(e, 'stderr', None) or e}")
+            return
+    else:
+        try:
+            model.save_pretrained_gguf(gguf_dir, tokenizer, quantization_method="f16")
         except Exception as e:
-            print(f"  ✗ Error exporting {quant_method}: {e}")
+            print(f"  ✗ Error exporting F16: {e}")
+            return
+
+        # Unsloth picks the file name; the newest F16 file is the one just written
+        f16_files = [path for path in Path(gguf_dir).glob("*.gguf") if path.name.lower().endswith("f16.gguf")]
+        if not f16_files:
+            print(f"  ✗ F16 GGUF file not generated")
+            return
+        f16_path = str(max(f16_files, key=lambda path: path.stat().st_mtime))
+    print(f"  ✓ Saved: {os.path.basename(f16_path)} ({format_size(os.path.getsize(f16_path))})")
+
+    if not os.path.exists(LLAMA_QUANTIZE):
+        print(f"  ✗ llama-quantize not found at {LLAMA_QUANTIZE} (run convert_to_gguf.sh to build it)")
+        return
+
+    # Each llama-quantize is its own process, so threads only wait on them
+    # (no GIL contention). It is multithreaded too, so run at most one per
+    # two cores to avoid oversubscribing the CPU.
+    max_workers = max(1, min(len(quantization_methods), (os.cpu_count() or 2) // 2))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            quant_method: executor.submit(
+                quantize_gguf,
+                f16_path,
+                os.path.join(gguf_dir, f"model-{quant_method}.gguf"),
+                quant_method,
+            )
+            for quant_method in quantization_methods
+        }
+
+        for quant_method, future in futures.items():
+            print(f"\n→ {quant_method.upper()} quantization...")
+            try:
+                gguf_file = future.result()
+                print(f"  ✓ Saved: {os.path.basename(gguf_file)}")
+                print(f"  ✓ Size: {format_size(os.path.getsize(gguf_file))}")
+            except subprocess.CalledProcessError as e:
+                print(f"  ✗ Error exporting {quant_method}: {e.stderr.strip() or e}")
 
     print(f"\n✓ GGUF models saved to: {gguf_dir}")
 
@@ -221,6 +305,8 @@ def export_4bit_quantized(model_path, output_path):
         max_seq_length=2048,
         dtype=None,
         load_in_4bit=True,  # Quantize to 4-bit
+        low_cpu_mem_usage=True,  # Quantize tensor by tensor instead of loading all FP16 weights into RAM first
+        device_map="auto",
     )
 
     print(f"✓ Model quantized to 4-bit")
@@ -230,7 +316,7 @@ def export_4bit_quantized(model_path, output_path):
     print(f"\nSaving to: {output_path}")
     os.makedirs(output_path, exist_ok=True)
 
-    model.save_pretrained(output_path)
+    model.save_pretrained(output_path, max_shard_size=MAX_SHARD_SIZE, safe_serialization=True)
     tokenizer.save_pretrained(output_path)
 
     print(f"✓ 4-bit model saved")
@@ -267,18 +353,26 @@ def main():
 
     # Step 3: Export 16-bit merged model
     merged_model = None
+    merged_16bit_path = None
     if EXPORT_16BIT:
         merged_16bit_path = os.path.join(OUTPUT_BASE, "16bit")
+        free_gpu_memory()
         merged_model = merge_and_export_16bit(model, tokenizer, merged_16bit_path)
 
-    # Step 4: Export GGUF
+    # Step 4: Export GGUF (from the saved 16-bit files when there are some,
+    # so GGUF-only runs never write the safetensors copy)
     if EXPORT_GGUF:
         if merged_model is None:
             # Need to merge first
             print("\nMerging model for GGUF export...")
             merged_model = model.merge_and_unload()
 
-        export_gguf(merged_model, tokenizer, OUTPUT_BASE, GGUF_QUANTIZATION_METHODS)
+        export_gguf(merged_model, tokenizer, OUTPUT_BASE, GGUF_QUANTIZATION_METHODS, merged_16bit_path)
+
+    # The adapter and merged weights aren't needed past this point; drop them
+    # so the 4-bit reload doesn't have to fit next to them in VRAM
+    del model, merged_model
+    free_gpu_memory()
 
     # Step 5: Export 4-bit quantized (optional)
     if EXPORT_4BIT:
@@ -287,6 +381,7 @@ def main():
         else:
             quantized_4bit_path = os.path.join(OUTPUT_BASE, "4bit")
             export_4bit_quantized(merged_16bit_path, quantized_4bit_path)
+            free_gpu_memory()
 
     # Step 6: Summary
     print_separator("Export Complete")
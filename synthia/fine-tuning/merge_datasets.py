@@ -7,75 +7,146 @@ Combines:
 - Flask/Jinja2 template examples
 """
 
-import json
-import random
+import argparse
+import hashlib
 import os
+import shutil
 
-def load_jsonl(filepath):
-    """Load examples from a JSONL file."""
-    examples = []
-    if not os.path.exists(filepath):
-        print(f"Warning: {filepath} not found, skipping")
-        return examples
+import numpy as np
+import orjson
 
-    with open(filepath, "r") as f:
-        for line in f:
-            examples.append(json.loads(line))
-    return examples
+def iter_lines(filepath):
+    """Yield the raw JSONL lines of a file (bytes, newline-terminated), skipping malformed lines.
 
-def save_jsonl(examples, filepath):
-    """Save examples to a JSONL file."""
-    with open(filepath, "w") as f:
-        for example in examples:
-            f.write(json.dumps(example) + "\n")
-
-def main():
+    The merge only shuffles and splits whole records, so each line is only
+    checked with orjson and written back exactly as read.
+    """
+    if not os.path.exists(filepath):
+        print(f"Warning: {filepath} not found, skipping")
+        return
+
+    with open(filepath, "rb") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                print(f"Warning: {filepath}:{line_number}: skipping malformed line ({e})")
+                continue
+            yield line if line.endswith(b"\n") else line + b"\n"
+
+def save_lines(lines, filepath):
+    """Save raw JSONL lines to a file with a single write."""
+    with open(filepath, "wb") as f:
+        f.write(b"".join(lines))
+
+def concat_files(paths, filepath):
+    """Concatenate JSONL files byte for byte into filepath, without parsing them"""
+    with open(filepath, "wb") as dst:
+        for path in paths:
+            if not os.path.exists(path):
+                print(f"Warning: {path} not found, skipping")
+                continue
+            with open(path, "rb") as src:
+                shutil.copyfileobj(src, dst, 1 << 20)
+                if src.tell() == 0:
+                    continue
+                # Keep the next file's first record on its own line
+                src.seek(-1, os.SEEK_END)
+                if src.read(1) != b"\n":
+                    dst.write(b"\n")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Merge the training datasets into train_merged.jsonl and valid_merged.jsonl")
+    parser.add_argument(
+        "--concat-only",
+        action="store_true",
+        help="Concatenate the training files as-is and keep the original validation set (no validation, shuffle or re-split)",
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
     data_dir = "/Users/zachswift/projects/agent-power-tools/synthia/fine-tuning/data"
+    train_path = os.path.join(data_dir, "train_merged.jsonl")
+    valid_path = os.path.join(data_dir, "valid_merged.jsonl")
 
-    print("Loading datasets...")
+    if args.concat_only:
+        sources = ["train.jsonl", "failure_recovery.jsonl", "flask_templates.jsonl"]
+        concat_files([os.path.join(data_dir, name) for name in sources], train_path)
+        concat_files([os.path.join(data_dir, "valid.jsonl")], valid_path)
+        print(f"Concatenated {', '.join(sources)} -> {train_path}")
+        print(f"Copied valid.jsonl -> {valid_path}")
+        return
 
-    # Load existing training data
-    original_train = load_jsonl(os.path.join(data_dir, "train.jsonl"))
-    original_valid = load_jsonl(os.path.join(data_dir, "valid.jsonl"))
+    print("Loading datasets...")
 
-    print(f"Original training examples: {len(original_train)}")
-    print(f"Original validation examples: {len(original_valid)}")
+    # Load every example into one list, counting how many came from each
+    # file, and give each record a random sort key as it is loaded. The
+    # shuffle is then an argsort of the keys, so the records themselves are
+    # never copied into a shuffled list.
+    rng = np.random.default_rng(42)  # For reproducibility
+    all_examples = []
+    key_batches = []
+
+    # Records that already appeared in an earlier file are dropped, keyed by a
+    # 128-bit hash of the raw line. Repeats within one file are kept: the
+    # generators repeat examples on purpose to weight them.
+    seen = set()
+    duplicate_count = 0
+
+    def not_in_earlier_files(lines, file_digests):
+        nonlocal duplicate_count
+        for line in lines:
+            digest = hashlib.blake2b(line, digest_size=16).digest()
+            if digest in seen:
+                duplicate_count += 1
+                continue
+            file_digests.add(digest)
+            yield line
+
+    def load(filename):
+        start = len(all_examples)
+        file_digests = set()
+        all_examples.extend(not_in_earlier_files(iter_lines(os.path.join(data_dir, filename)), file_digests))
+        seen.update(file_digests)
+        count = len(all_examples) - start
+        key_batches.append(rng.integers(0, 2**63, size=count, dtype=np.int64))
+        return count
+
+    original_count = load("train.jsonl")
+
+    # The original validation set is replaced by the new split; only report its size
+    original_valid_count = sum(1 for _ in iter_lines(os.path.join(data_dir, "valid.jsonl")))
+
+    print(f"Original training examples: {original_count}")
+    print(f"Original validation examples: {original_valid_count}")
 
     # Load new datasets
-    failure_recovery = load_jsonl(os.path.join(data_dir, "failure_recovery.jsonl"))
-    flask_templates = load_jsonl(os.path.join(data_dir, "flask_templates.jsonl"))
-
-    print(f"Failure recovery examples: {len(failure_recovery)}")
-    print(f"Flask template examples: {len(flask_templates)}")
-
-    # Combine all examples
-    all_examples = []
-    all_examples.extend(original_train)
-    all_examples.extend(failure_recovery)
-    all_examples.extend(flask_templates)
+    failure_recovery_count = load("failure_recovery.jsonl")
+    flask_templates_count = load("flask_templates.jsonl")
 
-    # Shuffle for good distribution
-    random.seed(42)  # For reproducibility
-    random.shuffle(all_examples)
+    print(f"Failure recovery examples: {failure_recovery_count}")
+    print(f"Flask template examples: {flask_templates_count}")
+    print(f"Duplicate examples removed: {duplicate_count}")
 
-    # Split into train/validation (90/10 split)
+    # Shuffle for good distribution and split into train/validation (90/10 split)
+    order = np.argsort(np.concatenate(key_batches), kind="stable")
     split_idx = int(len(all_examples) * 0.9)
-    train_examples = all_examples[:split_idx]
-    valid_examples = all_examples[split_idx:]
+    train_order = order[:split_idx]
+    valid_order = order[split_idx:]
 
     # Keep original validation if we want consistency
     # Or use new split - let's use new split to include all new examples
     print(f"\nNew dataset sizes:")
-    print(f"Training: {len(train_examples)} examples")
-    print(f"Validation: {len(valid_examples)} examples")
+    print(f"Training: {len(train_order)} examples")
+    print(f"Validation: {len(valid_order)} examples")
     print(f"Total: {len(all_examples)} examples")
 
     # Save merged datasets
-    train_path = os.path.join(data_dir, "train_merged.jsonl")
-    valid_path = os.path.join(data_dir, "valid_merged.jsonl")
-
-    save_jsonl(train_examples, train_path)
-    save_jsonl(valid_examples, valid_path)
+    save_lines((all_examples[i] for i in train_order.tolist()), train_path)
+    save_lines((all_examples[i] for i in valid_order.tolist()), valid_path)
 
     print(f"\nMerged datasets saved:")
     print(f"Training: {train_path}")
@@ -91,9 +162,9 @@ def main():
 
     # Analyze example types
     print(f"\nDataset composition:")
-    print(f"Original examples: {len(original_train)} ({len(original_train)/len(all_examples)*100:.1f}%)")
-    print(f"Failure recovery: {len(failure_recovery)} ({len(failure_recovery)/len(all_examples)*100:.1f}%)")
-    print(f"Flask templates: {len(flask_templates)} ({len(flask_templates)/len(all_examples)*100:.1f}%)")
+    print(f"Original examples: {original_count} ({original_count/len(all_examples)*100:.1f}%)")
+    print(f"Failure recovery: {failure_recovery_count} ({failure_recovery_count/len(all_examples)*100:.1f}%)")
+    print(f"Flask templates: {flask_templates_count} ({flask_templates_count/len(all_examples)*100:.1f}%)")
 
 if __name__ == "__main__":
     main()
@@ -2,9 +2,12 @@
 Test the 16-bit merged model BEFORE GGUF conversion
 This will tell us if the problem is the model itself or the GGUF conversion
 """
+import re
+import time
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import AutoTokenizer
 import json
+from diagnostics import load_model_fast_attention
 
 print("="*80)
 print("TESTING 16-BIT MODEL (BEFORE GGUF CONVERSION)")
@@ -15,12 +18,18 @@ MODEL_PATH = "./outputs/qwen2.5-coder-synthia-merged/16bit"
 
 print(f"\n1. Loading model from: {MODEL_PATH}")
 tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
-model = AutoModelForCausalLM.from_pretrained(
+model = load_model_fast_attention(
     MODEL_PATH,
     torch_dtype=torch.float16,
     device_map="auto",  # Automatically use GPU if available
 )
 
+# Static KV cache keeps decode shapes fixed, so the compiled decode step can
+# be captured as a CUDA graph instead of recompiling as the cache grows
+model.generation_config.use_cache = True
+model.generation_config.cache_implementation = "static"
+model.forward = torch.compile(model.forward, mode="reduce-overhead", fullgraph=False)
+
 print("   ✓ Model loaded")
 
 # Check chat template
@@ -55,14 +64,24 @@ print("   " + formatted_input.replace("\n", "\n   "))
 inputs = tokenizer(formatted_input, return_tensors="pt").to(model.device)
 
 print(f"\n4. Generating response...")
+generation_kwargs = dict(
+    max_new_tokens=200,
+    temperature=0.7,
+    do_sample=True,
+    pad_token_id=tokenizer.eos_token_id,
+)
 with torch.no_grad():
-    outputs = model.generate(
-        **inputs,
-        max_new_tokens=200,
-        temperature=0.7,
-        do_sample=True,
-        pad_token_id=tokenizer.eos_token_id,
-    )
+    # Warm-up with the same settings as the timed run: the static cache is
+    # sized from max_new_tokens, so a shorter warm-up would leave a cache of a
+    # different shape and the timed run would recompile
+    model.generate(**inputs, **generation_kwargs)
+
+    start = time.time()
+    outputs = model.generate(**inputs, **generation_kwargs)
+    elapsed = time.time() - start
+
+new_tokens = outputs.shape[-1] - inputs["input_ids"].shape[-1]
+print(f"   ✓ Generated {new_tokens} tokens in {elapsed:.2f} seconds")
 
 # Decode
 response = tokenizer.decode(outputs[0], skip_special_tokens=False)
@@ -73,7 +92,9 @@ print("="*80)
 print(response)
 
 # Extract just the assistant response
-assistant_response = response.split("<|im_start|>assistant")[-1].split("<|im_end|>")[0].strip()
+# Runs to the end of the output when the model never emits <|im_end|>
+assistant_match = re.search(r"<\|im_start\|>assistant(.*?)(?:<\|im_end\|>|$)", response, re.DOTALL)
+assistant_response = assistant_match.group(1).strip() if assistant_match else response.strip()
 
 print("\n" + "="*80)
 print("ASSISTANT RESPONSE ONLY:")
@@ -86,7 +107,9 @@ print("="*80)
 
 # Check for hallucination indicators
 hallucination_markers = ["𝆣", "NdrFc", "𥖨", "คู่", "ניוזל", "zwłaszc", "ปกคร", "習", "魔龙令牌"]
-found_hallucinations = [marker for marker in hallucination_markers if marker in assistant_response]
+hallucination_re = re.compile("|".join(map(re.escape, hallucination_markers)))
+# One pass over the response; dict.fromkeys dedupes in order of appearance
+found_hallucinations = list(dict.fromkeys(hallucination_re.findall(assistant_response)))
 
 if found_hallucinations:
     print(f"❌ HALLUCINATIONS DETECTED: {found_hallucinations}")
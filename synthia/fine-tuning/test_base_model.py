@@ -4,7 +4,7 @@ to see if the generation loop issue exists in the base model
 """
 import torch
 from unsloth import FastLanguageModel
-from transformers import AutoTokenizer
+from diagnostics import load_official_chat_template
 
 print("="*80)
 print("TESTING BASE MODEL (before fine-tuning)")
@@ -21,8 +21,7 @@ model, tokenizer = FastLanguageModel.from_pretrained(
 
 # Load official Qwen tokenizer with chat template
 print("\n2. Loading chat template from official Qwen...")
-official_tokenizer = AutoTokenizer.from_pretrained("Qwen/Qwen2.5-Coder-7B-Instruct")
-tokenizer.chat_template = official_tokenizer.chat_template
+tokenizer.chat_template = load_official_chat_template()
 
 print(f"   ✓ Chat template loaded")
 print(f"   EOS token: {tokenizer.eos_token} (ID: {tokenizer.eos_token_id})")
@@ -50,8 +49,8 @@ start = time.time()
 outputs = model.generate(
     **inputs,
     max_new_tokens=50,
-    temperature=0.7,
-    do_sample=True,
+    do_sample=False,  # Greedy, so timings are comparable between runs
+    use_cache=True,
     pad_token_id=tokenizer.pad_token_id,
     eos_token_id=tokenizer.eos_token_id,
 )
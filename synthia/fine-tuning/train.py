@@ -14,12 +14,15 @@ Expected training time: ~1-2 hours on RTX 4060
 
 import os
 import json
+import hashlib
 import torch
-from datasets import load_dataset
+from itertools import chain
+from datasets import load_dataset, load_from_disk
 from unsloth import FastLanguageModel
 from trl import SFTTrainer
 from transformers import TrainingArguments
 from datetime import datetime
+from diagnostics import load_official_chat_template
 
 # ============================================================================
 # CONFIGURATION - Adjust these settings for your needs
@@ -45,6 +48,8 @@ DATASET_PATHS = [
     "data/train_improved.jsonl"  # Additional improved training examples
 ]
 OUTPUT_DIR = "./outputs/qwen2.5-coder-synthia-tool-use"  # Where to save checkpoints
+TOKENIZED_CACHE_DIR = "data/tokenized_cache"  # Formatted + tokenized dataset, reused across runs
+TOKENIZED_CACHE_FORMAT = "text,input_ids,attention_mask,length"  # Cached columns; changing this invalidates old caches
 # RESUME_FROM_CHECKPOINT = "./outputs/qwen2.5-coder-synthia-tool-use"  # Uncomment to continue from existing checkpoint
 NUM_TRAIN_EPOCHS = 1  # Number of full passes through dataset
 PER_DEVICE_BATCH_SIZE = 1  # Batch size per GPU (1-2 for 8GB VRAM)
@@ -54,12 +59,20 @@ WARMUP_STEPS = 10  # Linear warmup steps
 MAX_STEPS = -1  # Set to positive number to override epochs (e.g., 200)
 SAVE_STEPS = 50  # Save checkpoint every N steps
 LOGGING_STEPS = 10  # Log metrics every N steps
+GROUP_BY_LENGTH = True  # Batch similar-length examples together to cut padding (matters once batch size > 1)
+PACKING = True  # Pack several EOS-separated examples into each MAX_SEQ_LENGTH sequence (no pad tokens; examples can attend across boundaries)
 
 # Optimization settings for 8GB VRAM
-USE_GRADIENT_CHECKPOINTING = "unsloth"  # "unsloth" is more memory efficient
-OPTIMIZER = "adamw_8bit"  # 8-bit optimizer saves ~50% memory over adamw
-FP16 = False  # Use FP16 mixed precision (disable on RTX 4060 if issues)
-BF16 = False  # Use BF16 mixed precision (better if GPU supports it)
+# Checkpointing recomputes activations (~30% more compute per step); it's only
+# needed below 16GB VRAM, larger cards fit the activations without it
+GPU_PROPERTIES = torch.cuda.get_device_properties(0) if torch.cuda.is_available() else None  # Queried once, None on CPU
+TOTAL_VRAM_GB = GPU_PROPERTIES.total_memory / 1024**3 if GPU_PROPERTIES else 0
+USE_GRADIENT_CHECKPOINTING = "unsloth" if TOTAL_VRAM_GB < 16 else False  # "unsloth" is more memory efficient
+OPTIMIZER = "paged_adamw_8bit"  # 8-bit optimizer saves ~50% memory over adamw; paged states spill to CPU RAM instead of OOMing on spikes
+# BF16 on Ampere and newer (compute capability 8.0+, incl. the RTX 4060): FP32 range,
+# so no loss scaling; older GPUs fall back to FP16
+BF16 = GPU_PROPERTIES is not None and GPU_PROPERTIES.major >= 8  # Use BF16 mixed precision
+FP16 = GPU_PROPERTIES is not None and not BF16  # Use FP16 mixed precision
 
 # Advanced settings
 SEED = 42  # Random seed for reproducibility
@@ -84,13 +97,30 @@ def format_vram(bytes_value):
 
 def print_gpu_memory():
     """Print current GPU memory usage"""
-    if torch.cuda.is_available():
+    if GPU_PROPERTIES:
+        # Caching-allocator counters: read on the host, no driver call
         allocated = torch.cuda.memory_allocated()
         reserved = torch.cuda.memory_reserved()
         print(f"GPU Memory: {format_vram(allocated)} allocated, {format_vram(reserved)} reserved")
     else:
         print("CUDA not available - running on CPU (will be very slow!)")
 
+def check_4bit_quantization(model):
+    """Confirm the 4-bit weights are NF4 with double quantization"""
+    quant_config = getattr(model.config, "quantization_config", None)
+    if quant_config is None:
+        print("⚠️  No quantization config found - model is not loaded in 4-bit")
+        return
+    if not isinstance(quant_config, dict):
+        quant_config = quant_config.to_dict()
+
+    quant_type = quant_config.get("bnb_4bit_quant_type")
+    double_quant = quant_config.get("bnb_4bit_use_double_quant")
+    print(f"4-bit quantization: {quant_type}, double quant: {double_quant}, "
+          f"compute dtype: {quant_config.get('bnb_4bit_compute_dtype')}")
+    if quant_type != "nf4" or not double_quant:
+        print("⚠️  Expected NF4 with double quantization - weights use more memory/bandwidth than necessary")
+
 def load_and_validate_dataset(dataset_paths):
     """Load multiple datasets and combine them"""
     print_separator("Loading Dataset")
@@ -105,7 +135,9 @@ def load_and_validate_dataset(dataset_paths):
     for path in dataset_paths:
         print(f"  - {path}")
 
-    dataset = load_dataset('json', data_files=dataset_paths, split='train')
+    # The JSON builder parses one file per worker, so the files load in parallel
+    num_proc = max(1, min(os.cpu_count() or 1, len(dataset_paths)))
+    dataset = load_dataset('json', data_files=dataset_paths, split='train', num_proc=num_proc)
 
     print(f"✓ Loaded combined dataset with {len(dataset)} examples")
 
@@ -141,9 +173,7 @@ def create_model_and_tokenizer(model_name, max_seq_length, load_in_4bit, lora_ra
         # CRITICAL FIX: Ensure chat template is set (same fix as above)
         if not tokenizer.chat_template or not tokenizer.chat_template.strip():
             print("⚠️  Tokenizer missing chat template - loading from official Qwen2.5-Coder...")
-            from transformers import AutoTokenizer
-            official_tokenizer = AutoTokenizer.from_pretrained("Qwen/Qwen2.5-Coder-7B-Instruct")
-            tokenizer.chat_template = official_tokenizer.chat_template
+            tokenizer.chat_template = load_official_chat_template()
             print("✓ Chat template loaded from official Qwen2.5-Coder")
         else:
             print(f"✓ Chat template already configured")
@@ -158,6 +188,9 @@ def create_model_and_tokenizer(model_name, max_seq_length, load_in_4bit, lora_ra
         print(f"LoRA rank: {lora_rank}, alpha: {lora_alpha}, dropout: {lora_dropout}")
 
         # Load model with Unsloth optimizations
+        # Unsloth patches Qwen2 with its own Triton kernels (RoPE, SwiGLU, RMSNorm and a
+        # chunked fused cross-entropy that never materializes the full [B, L, 152k] logits),
+        # so Liger kernels must not be applied on top - they'd replace the same modules
         model, tokenizer = FastLanguageModel.from_pretrained(
             model_name=model_name,
             max_seq_length=max_seq_length,
@@ -174,9 +207,7 @@ def create_model_and_tokenizer(model_name, max_seq_length, load_in_4bit, lora_ra
         # Note: We check for empty/None/whitespace to catch all cases
         if not tokenizer.chat_template or not tokenizer.chat_template.strip():
             print("⚠️  Tokenizer missing chat template - loading from official Qwen2.5-Coder...")
-            from transformers import AutoTokenizer
-            official_tokenizer = AutoTokenizer.from_pretrained("Qwen/Qwen2.5-Coder-7B-Instruct")
-            tokenizer.chat_template = official_tokenizer.chat_template
+            tokenizer.chat_template = load_official_chat_template()
             print("✓ Chat template loaded from official Qwen2.5-Coder")
         else:
             print(f"✓ Chat template already configured")
@@ -200,6 +231,13 @@ def create_model_and_tokenizer(model_name, max_seq_length, load_in_4bit, lora_ra
     print(f"✓ LoRA adapters added")
     print_gpu_memory()
 
+    if load_in_4bit:
+        check_4bit_quantization(model)
+
+    # Unsloth picks FlashAttention-2 by itself when flash-attn is installed
+    # (pip install flash-attn), otherwise it falls back to xformers/SDPA
+    print(f"Attention implementation: {getattr(model.config, '_attn_implementation', 'unknown')}")
+
     # Verify chat template is working
     print("\n🔍 Verifying chat template...")
     try:
@@ -233,6 +271,8 @@ Training Settings:
   - Batch size per device: {PER_DEVICE_BATCH_SIZE}
   - Gradient accumulation: {GRADIENT_ACCUMULATION_STEPS}
   - Effective batch size: {effective_batch_size}
+  - Group by length: {GROUP_BY_LENGTH and not PACKING}
+  - Sequence packing: {PACKING}
   - Learning rate: {LEARNING_RATE}
   - Warmup steps: {WARMUP_STEPS}
   - Optimizer: {OPTIMIZER}
@@ -251,19 +291,67 @@ Output:
 
 def format_messages_for_training(examples, tokenizer):
     """Format messages using chat template"""
-    texts = []
-    for messages in examples["messages"]:
-        # Apply chat template
-        text = tokenizer.apply_chat_template(
-            messages,
-            tokenize=False,
-            add_generation_prompt=False
-        )
-        # CRITICAL FIX: Append EOS token so model learns when to stop
-        # Without this, model will never generate EOS and get stuck in infinite loops
-        text = text + tokenizer.eos_token
-        texts.append(text)
-    return {"text": texts}
+    # Apply chat template to the whole batch (the template is compiled once per call)
+    texts = tokenizer.apply_chat_template(
+        examples["messages"],
+        tokenize=False,
+        add_generation_prompt=False
+    )
+    # CRITICAL FIX: Append EOS token so model learns when to stop
+    # Without this, model will never generate EOS and get stuck in infinite loops
+    return {"text": [text + tokenizer.eos_token for text in texts]}
+
+def tokenize_with_lengths(examples, tokenizer, max_seq_length):
+    """Tokenize formatted text and record each sequence length for group_by_length"""
+    tokenized = tokenizer(examples["text"], truncation=True, max_length=max_seq_length)
+    tokenized["length"] = [len(input_ids) for input_ids in tokenized["input_ids"]]
+    return tokenized
+
+def pack_sequences(examples, max_seq_length):
+    """Concatenate tokenized examples (each already ends with EOS) and cut them into max_seq_length blocks"""
+    concatenated = list(chain.from_iterable(examples["input_ids"]))
+    blocks = [concatenated[i:i + max_seq_length] for i in range(0, len(concatenated), max_seq_length)]
+    return {"input_ids": blocks, "attention_mask": [[1] * len(block) for block in blocks]}
+
+def tokenized_cache_path(dataset_paths, tokenizer, max_seq_length):
+    """Cache directory for this exact combination of data files, tokenizer, chat template and length"""
+    key = hashlib.sha256(TOKENIZED_CACHE_FORMAT.encode())
+    # MODEL_NAME rather than tokenizer.name_or_path, which points at the
+    # checkpoint directory when resuming with the same tokenizer
+    key.update(f"{MODEL_NAME}:{len(tokenizer)}\n".encode())
+    for path in dataset_paths:
+        stat = os.stat(path)
+        key.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    key.update(tokenizer.chat_template.encode())
+    key.update(f"{tokenizer.eos_token}:{max_seq_length}".encode())
+    return os.path.join(TOKENIZED_CACHE_DIR, key.hexdigest()[:16])
+
+def prepare_dataset(dataset, tokenizer, dataset_paths, max_seq_length):
+    """Apply the chat template and tokenize once, reusing the saved result on later runs"""
+    cache_path = tokenized_cache_path(dataset_paths, tokenizer, max_seq_length)
+    if os.path.isdir(cache_path):
+        print(f"Loading tokenized dataset from cache: {cache_path}")
+        return load_from_disk(cache_path)  # Memory-mapped Arrow, no re-tokenizing
+
+    num_proc = max(1, min(os.cpu_count() or 1, len(dataset) // 1000))
+
+    print("Applying chat template to all examples...")
+    dataset = dataset.map(
+        lambda examples: format_messages_for_training(examples, tokenizer),
+        batched=True,
+        num_proc=num_proc,
+    )
+
+    print("Tokenizing...")
+    dataset = dataset.map(
+        lambda examples: tokenize_with_lengths(examples, tokenizer, max_seq_length),
+        batched=True,
+        num_proc=num_proc,
+    )
+
+    dataset.save_to_disk(cache_path)
+    print(f"✓ Tokenized dataset cached to: {cache_path}")
+    return dataset
 
 # ============================================================================
 # MAIN TRAINING LOOP
@@ -275,10 +363,10 @@ def main():
     print_separator("Synthia Fine-Tuning Script")
     print(f"Start time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"PyTorch version: {torch.__version__}")
-    print(f"CUDA available: {torch.cuda.is_available()}")
-    if torch.cuda.is_available():
-        print(f"CUDA device: {torch.cuda.get_device_name(0)}")
-        print(f"Total VRAM: {format_vram(torch.cuda.get_device_properties(0).total_memory)}")
+    print(f"CUDA available: {GPU_PROPERTIES is not None}")
+    if GPU_PROPERTIES:
+        print(f"CUDA device: {GPU_PROPERTIES.name}")
+        print(f"Total VRAM: {format_vram(GPU_PROPERTIES.total_memory)}")
 
     # Step 1: Load dataset
     dataset = load_and_validate_dataset(DATASET_PATHS)
@@ -296,12 +384,17 @@ def main():
 
     # Step 3: Format dataset for training
     print_separator("Preparing Dataset")
-    print("Applying chat template to all examples...")
-    dataset = dataset.map(
-        lambda examples: format_messages_for_training(examples, tokenizer),
-        batched=True,
-    )
+    dataset = prepare_dataset(dataset, tokenizer, DATASET_PATHS, MAX_SEQ_LENGTH)
     print(f"✓ Dataset prepared with {len(dataset)} examples")
+    num_examples = len(dataset)
+
+    if PACKING:
+        dataset = dataset.map(
+            lambda examples: pack_sequences(examples, MAX_SEQ_LENGTH),
+            batched=True,
+            remove_columns=dataset.column_names,
+        )
+        print(f"✓ Packed into {len(dataset)} sequences of up to {MAX_SEQ_LENGTH} tokens")
 
     # Step 4: Print training configuration
     print_training_config()
@@ -319,6 +412,8 @@ def main():
         # Batch size and accumulation
         per_device_train_batch_size=PER_DEVICE_BATCH_SIZE,
         gradient_accumulation_steps=GRADIENT_ACCUMULATION_STEPS,
+        group_by_length=GROUP_BY_LENGTH and not PACKING,  # Packed blocks are all ~MAX_SEQ_LENGTH
+        length_column_name="length",  # Precomputed in prepare_dataset
 
         # Optimizer
         optim=OPTIMIZER,
@@ -348,10 +443,12 @@ def main():
         model=model,
         tokenizer=tokenizer,
         train_dataset=dataset,
-        dataset_text_field="text",  # Use the formatted text field
         max_seq_length=MAX_SEQ_LENGTH,
         args=training_args,
-        packing=False,  # Don't pack sequences (can cause issues with tool use)
+        packing=False,  # Packing (if enabled) is already done on the tokenized dataset above
+        # input_ids are already in the dataset (tokenized once and cached by prepare_dataset),
+        # so don't re-tokenize the text; the default collator pads and builds the labels
+        dataset_kwargs={"skip_prepare_dataset": True},
     )
 
     print("✓ Trainer initialized")
@@ -379,7 +476,8 @@ def main():
     training_info = {
         "model_name": MODEL_NAME,
         "training_date": datetime.now().isoformat(),
-        "num_examples": len(dataset),
+        "num_examples": num_examples,
+        "packing": PACKING,
         "num_epochs": NUM_TRAIN_EPOCHS,
         "lora_rank": LORA_RANK,
         "lora_alpha": LORA_ALPHA,
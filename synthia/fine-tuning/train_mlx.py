@@ -8,11 +8,27 @@ Base model: Qwen/Qwen2.5-Coder-7B-Instruct
 
 import json
 import argparse
+from itertools import islice
 from pathlib import Path
-import mlx.core as mx
-import mlx.nn as nn
-from mlx_lm import load, generate
-from mlx_lm.tuner import lora, utils
+from types import SimpleNamespace
+import orjson
+# Written against the mlx-lm 0.21.0 tuner API (pinned in requirements.txt); the
+# train()/load_dataset()/fetch_from_hub() signatures change between releases
+import mlx.optimizers as optim
+from mlx.utils import tree_flatten, tree_unflatten
+from mlx_lm import generate
+from mlx_lm.lora import CONFIG_DEFAULTS
+from mlx_lm.tuner.datasets import load_dataset
+from mlx_lm.tuner.trainer import TrainingArgs, train
+from mlx_lm.tuner.utils import linear_to_lora_layers
+from mlx_lm.utils import fetch_from_hub, get_model_path, save_config, save_weights
+
+
+def load_model(model_path: str):
+    """Load model, tokenizer and HF config once; later stages reuse them in memory"""
+    print(f"Loading model: {model_path}")
+    model, config, tokenizer = fetch_from_hub(get_model_path(model_path))
+    return model, tokenizer, config
 
 
 def validate_dataset(data_path: Path):
@@ -25,14 +41,17 @@ def validate_dataset(data_path: Path):
     if not train_file.exists():
         raise FileNotFoundError(f"Training file not found: {train_file}")
 
-    with open(train_file) as f:
-        lines = f.readlines()
+    # One streaming pass: keep the first 5 lines for checking and only count
+    # the rest (as bytes, so they're never decoded)
+    with open(train_file, "rb") as f:
+        sample = list(islice(f, 5))
+        num_examples = len(sample) + sum(1 for _ in f)
 
-    print(f"Total training examples: {len(lines)}")
+    print(f"Total training examples: {num_examples}")
 
-    for i, line in enumerate(lines[:5]):  # Check first 5
+    for i, line in enumerate(sample):  # Check first 5
         try:
-            data = json.loads(line)
+            data = orjson.loads(line)
             assert "messages" in data, f"Line {i+1}: Missing 'messages' key"
 
             # Check message structure
@@ -46,10 +65,12 @@ def validate_dataset(data_path: Path):
             raise
 
     print("✓ Dataset validation passed!")
-    return len(lines)
+    return num_examples
 
 
 def train_stage(
+    model,
+    tokenizer,
     model_path: str,
     data_path: Path,
     stage_name: str,
@@ -60,8 +81,14 @@ def train_stage(
     lora_rank: int = 16,
     lora_alpha: int = 32,
     max_seq_length: int = 2048,
+    resume_adapter_file: Path = None,
 ):
-    """Train one stage of fine-tuning"""
+    """Train one stage of fine-tuning with LoRA on the in-memory model
+
+    If the model already has LoRA layers from the previous stage, training
+    continues on those adapters. Otherwise new ones are added, starting from
+    resume_adapter_file when given.
+    """
 
     print(f"\n{'='*60}")
     print(f"STAGE: {stage_name}")
@@ -99,67 +126,89 @@ def train_stage(
         "num_layers": 16,  # Changed from lora_layers
     }
 
-    # Save config
+    # Train in-process with the mlx_lm tuner API. The model stays resident, so
+    # the next stage keeps training the same adapters without reloading anything.
+    # Anything not set above uses the same defaults as the mlx_lm.lora CLI.
+    args = SimpleNamespace(**{**CONFIG_DEFAULTS, **config})
+
+    # Save config under the name mlx_lm expects next to adapters.safetensors,
+    # so the adapters also work with mlx_lm.fuse / mlx_lm.generate --adapter-path
     output_dir.mkdir(parents=True, exist_ok=True)
-    config_path = output_dir / "config.json"
+    config_path = output_dir / "adapter_config.json"
     with open(config_path, "w") as f:
-        json.dump(config, f, indent=2)
+        json.dump(vars(args), f, indent=2)
     print(f"✓ Saved config to {config_path}\n")
 
-    # Run training via command line (easier than Python API)
-    import subprocess
-
-    cmd = [
-        "mlx_lm.lora",
-        "--model", model_path,
-        "--data", str(data_path.absolute()),  # Use absolute path
-        "--train",
-        "-c", str(config_path),  # Use config file for all parameters
-    ]
-
-    print(f"Running: {' '.join(cmd)}\n")
-
+    train_set, valid_set, _ = load_dataset(args, tokenizer)
+
+    if not has_lora_layers(model):
+        model.freeze()
+        linear_to_lora_layers(model, args.num_layers, args.lora_parameters)
+        if resume_adapter_file:
+            print(f"Resuming from adapters: {resume_adapter_file}")
+            model.load_weights(str(resume_adapter_file), strict=False)
+
+    training_args = TrainingArgs(
+        batch_size=args.batch_size,
+        iters=args.iters,
+        val_batches=args.val_batches,
+        steps_per_report=args.steps_per_report,
+        steps_per_eval=args.steps_per_eval,
+        steps_per_save=args.save_every,
+        adapter_file=output_dir.absolute() / "adapters.safetensors",
+        max_seq_length=args.max_seq_length,
+        grad_checkpoint=args.grad_checkpoint,
+    )
+
+    model.train()
     try:
-        subprocess.run(cmd, check=True)
+        # train() compiles its step function with mx.compile
+        train(
+            model=model,
+            tokenizer=tokenizer,
+            optimizer=optim.Adam(learning_rate=args.learning_rate),
+            train_dataset=train_set,
+            val_dataset=valid_set,
+            args=training_args,
+        )
         print(f"\n✓ Stage '{stage_name}' training complete!")
         return True
-    except subprocess.CalledProcessError as e:
+    # Data and Metal/allocation errors; anything else is a bug and propagates
+    except (ValueError, RuntimeError, OSError) as e:
         print(f"\n✗ Training failed: {e}")
         return False
 
 
-def fuse_lora_weights(model_path: str, adapter_file: Path, output_path: Path):
-    """Fuse LoRA weights back into base model"""
+def has_lora_layers(model):
+    """True once linear_to_lora_layers has been applied to the model"""
+    return any(hasattr(module, "fuse") for _, module in model.named_modules())
+
+
+def fuse_lora_weights(model, tokenizer, config: dict, output_path: Path):
+    """Fuse LoRA weights into the in-memory model and save it"""
 
     print(f"\n{'='*60}")
     print(f"FUSING LORA WEIGHTS")
     print(f"{'='*60}")
-    print(f"Model: {model_path}")
-    print(f"Adapter: {adapter_file}")
     print(f"Output: {output_path}")
     print(f"{'='*60}\n")
 
-    import subprocess
-
-    cmd = [
-        "mlx_lm.fuse",
-        "--model", model_path,
-        "--adapter-path", str(adapter_file.parent),  # Use parent directory, not the file itself
-        "--save-path", str(output_path),
-    ]
-
-    print(f"Running: {' '.join(cmd)}\n")
-
     try:
-        subprocess.run(cmd, check=True)
+        fused_linears = [(name, module.fuse()) for name, module in model.named_modules() if hasattr(module, "fuse")]
+        model.update_modules(tree_unflatten(fused_linears))
+
+        output_path.mkdir(parents=True, exist_ok=True)
+        save_weights(output_path, dict(tree_flatten(model.parameters())), donate_weights=False)
+        save_config(config, config_path=output_path / "config.json")
+        tokenizer.save_pretrained(output_path)
         print(f"\n✓ LoRA weights fused! Model saved to {output_path}")
         return True
-    except subprocess.CalledProcessError as e:
+    except (ValueError, OSError) as e:
         print(f"\n✗ Fusing failed: {e}")
         return False
 
 
-def test_model(model_path: str, prompt: str):
+def test_model(model, tokenizer, model_path: str, prompt: str):
     """Quick test of fine-tuned model"""
 
     print(f"\n{'='*60}")
@@ -168,8 +217,6 @@ def test_model(model_path: str, prompt: str):
     print(f"Prompt: {prompt}")
     print(f"{'='*60}\n")
 
-    model, tokenizer = load(model_path)
-
     messages = [
         {"role": "system", "content": "You are Synthia, a helpful coding assistant with access to tools."},
         {"role": "user", "content": prompt}
@@ -234,17 +281,27 @@ def main():
     else:
         stages_to_run = [args.stage]
 
+    # Load the base model once and carry the LoRA adapters from stage to stage
+    # (the in-process equivalent of mlx_lm.lora --resume-adapter-file). They
+    # are only fused into the weights after the last stage, so the earlier
+    # stages save small adapter files instead of a full 7B model each.
+    # Starting at stage 2 or 3 resumes from the previous stage's adapters.
+    first_stage = stages_to_run[0]
+    resume_adapter_file = None
+    if first_stage != "1":
+        resume_adapter_file = output_base / f"stage{int(first_stage) - 1}" / "adapters.safetensors"
+        if not resume_adapter_file.exists():
+            raise FileNotFoundError(
+                f"Stage {int(first_stage) - 1} adapters not found: {resume_adapter_file} "
+                f"(run --stage {int(first_stage) - 1} first)"
+            )
+
+    model, tokenizer, config = load_model(base_model)
+
     # Run training stages
     for stage_num in stages_to_run:
         stage = stages[stage_num]
 
-        # Determine input model (previous stage output or base)
-        if stage_num == "1":
-            input_model = base_model
-        else:
-            prev_stage = str(int(stage_num) - 1)
-            input_model = str(output_base / f"synthia-stage{prev_stage}")
-
         output_dir = output_base / f"stage{stage_num}"
 
         print(f"\n{'#'*60}")
@@ -254,41 +311,50 @@ def main():
 
         # Train
         success = train_stage(
-            model_path=input_model,
+            model=model,
+            tokenizer=tokenizer,
+            model_path=base_model,
             data_path=data_path,
             stage_name=stage["name"],
             iterations=stage["iterations"],
             learning_rate=stage["lr"],
             output_dir=output_dir,
+            resume_adapter_file=resume_adapter_file,
         )
 
         if not success:
             print(f"✗ Stage {stage_num} failed. Stopping.")
             break
 
-        # Fuse weights
-        adapter_file = output_dir / "adapters.npz"
-        fused_output = output_base / f"synthia-stage{stage_num}"
+        saved_to = output_dir
 
-        success = fuse_lora_weights(
-            model_path=input_model,
-            adapter_file=adapter_file,
-            output_path=fused_output,
-        )
+        # Fuse weights once, after the final stage
+        if stage_num == stages_to_run[-1]:
+            fused_output = output_base / f"synthia-stage{stage_num}"
 
-        if not success:
-            print(f"✗ Fusing failed for stage {stage_num}. Stopping.")
-            break
+            success = fuse_lora_weights(
+                model=model,
+                tokenizer=tokenizer,
+                config=config,
+                output_path=fused_output,
+            )
+
+            if not success:
+                print(f"✗ Fusing failed for stage {stage_num}. Stopping.")
+                break
+            saved_to = fused_output
 
         print(f"\n{'='*60}")
         print(f"✓ STAGE {stage_num} COMPLETE!")
-        print(f"  Model saved to: {fused_output}")
+        print(f"  Model saved to: {saved_to}")
         print(f"{'='*60}\n")
 
         # Test if requested
         if args.test:
             test_model(
-                model_path=str(fused_output),
+                model=model,
+                tokenizer=tokenizer,
+                model_path=str(saved_to),
                 prompt="Read the file src/main.rs and tell me what it does"
             )
 
@@ -3,9 +3,18 @@ Quick validation script to check if setup is ready for training
 Runs basic checks without requiring GPU or full environment
 """
 
+import importlib.metadata
+import importlib.util
 import os
 import sys
 import json
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+# Datasets at least this big have their tool calls counted across processes;
+# below it, worker startup costs more than the parsing
+PARALLEL_COUNT_MIN_BYTES = 64 * 1024 * 1024
+COUNT_CHUNK_LINES = 10_000
 
 def print_header(title):
     print(f"\n{'='*60}")
@@ -27,6 +36,42 @@ def check_file_exists(path, description):
         print(f"✗ {description}: NOT FOUND")
         return False
 
+def count_tool_calls(lines):
+    """Return (examples, assistant tool calls) for an iterable of JSONL lines"""
+    examples = 0
+    tool_calls = 0
+    for line in lines:
+        example = json.loads(line)
+        examples += 1
+        for msg in example['messages']:
+            if msg.get('role') == 'assistant' and 'tool_calls' in msg:
+                tool_calls += len(msg['tool_calls'])
+    return examples, tool_calls
+
+def count_tool_calls_parallel(f):
+    """count_tool_calls over chunks of f in worker processes, with a bounded number of chunks in flight"""
+    examples = 0
+    tool_calls = 0
+
+    def collect(futures):
+        nonlocal examples, tool_calls
+        for future in futures:
+            chunk_examples, chunk_tool_calls = future.result()
+            examples += chunk_examples
+            tool_calls += chunk_tool_calls
+
+    with ProcessPoolExecutor() as executor:
+        max_in_flight = 2 * (os.cpu_count() or 1)
+        pending = set()
+        while chunk := list(islice(f, COUNT_CHUNK_LINES)):
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(executor.submit(count_tool_calls, chunk))
+        collect(pending)
+
+    return examples, tool_calls
+
 def validate_dataset(path):
     """Validate dataset format"""
     print_header("Validating Dataset")
@@ -35,28 +80,27 @@ def validate_dataset(path):
         return False
 
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-
-        print(f"  - Total examples: {len(lines)}")
-
-        # Parse first example
-        first_example = json.loads(lines[0])
-
-        if 'messages' not in first_example:
-            print("✗ Dataset missing 'messages' field")
-            return False
-
+        # Check the format on the first example, then stream the whole file
+        # once for the example and tool call counts
+        with open(path, 'rb') as f:
+            first_line = f.readline()
+            if not first_line:
+                print("✗ Dataset is empty")
+                return False
+
+            first_example = json.loads(first_line)
+            if 'messages' not in first_example:
+                print("✗ Dataset missing 'messages' field")
+                return False
+
+            f.seek(0)
+            if os.path.getsize(path) >= PARALLEL_COUNT_MIN_BYTES:
+                total_examples, tool_calls = count_tool_calls_parallel(f)
+            else:
+                total_examples, tool_calls = count_tool_calls(f)
+
+        print(f"  - Total examples: {total_examples}")
         print(f"  - Format: ChatML with {len(first_example['messages'])} messages per example")
-
-        # Count tool calls
-        tool_calls = 0
-        for line in lines:
-            example = json.loads(line)
-            for msg in example['messages']:
-                if msg.get('role') == 'assistant' and 'tool_calls' in msg:
-                    tool_calls += len(msg['tool_calls'])
-
         print(f"  - Total tool calls: {tool_calls}")
         print("✓ Dataset format is valid")
         return True
@@ -100,12 +144,17 @@ def check_python_imports():
     installed = []
     missing = []
 
+    # find_spec only locates the package; importing torch/unsloth just to see
+    # if they're installed would load CUDA and take several seconds each
     for module, name in packages:
-        try:
-            __import__(module)
+        if importlib.util.find_spec(module) is not None:
             installed.append(name)
-            print(f"✓ {name} installed")
-        except ImportError:
+            try:
+                version = importlib.metadata.version(module)
+            except importlib.metadata.PackageNotFoundError:
+                version = "unknown version"
+            print(f"✓ {name} installed ({version})")
+        else:
             missing.append(name)
             print(f"✗ {name} not installed")
 
@@ -3,6 +3,9 @@ Verify the training data was actually formatted correctly
 by checking what the trainer saw during training
 """
 import json
+import re
+from collections import Counter
+from itertools import islice
 from transformers import AutoTokenizer
 from datasets import load_dataset
 
@@ -34,47 +37,51 @@ if not tokenizer.chat_template:
     print("   ✓ Chat template loaded")
 
 # Load a few training examples
+# Only the first 3 examples are checked, so stream them instead of loading
+# and concatenating every file
+NUM_EXAMPLES = 3
 print("\n3. Loading training examples...")
-datasets = []
+examples = []
 for path in DATASET_PATHS:
+    if len(examples) >= NUM_EXAMPLES:
+        break
     try:
-        ds = load_dataset("json", data_files=path, split="train")
-        datasets.append(ds)
-        print(f"   ✓ Loaded {len(ds)} examples from {path}")
-    except:
-        pass
-
-# Combine datasets
-from datasets import concatenate_datasets
-combined = concatenate_datasets(datasets) if datasets else None
-
-if combined is None:
+        ds = load_dataset("json", data_files=path, split="train", streaming=True)
+        streamed = list(islice(ds, NUM_EXAMPLES - len(examples)))
+        examples.extend(streamed)
+        print(f"   ✓ Streamed {len(streamed)} examples from {path}")
+    except Exception as e:
+        print(f"   ⚠️ Could not load {path}: {e}")
+
+if not examples:
     print("   ❌ Could not load any datasets!")
     exit(1)
 
-print(f"\n4. Checking first 3 formatted examples:")
+print(f"\n4. Checking first {len(examples)} formatted examples:")
+
+# Apply chat template to all examples in one call (this is what train.py does)
+formatted_examples = tokenizer.apply_chat_template(
+    [example["messages"] for example in examples],
+    tokenize=False,
+    add_generation_prompt=False
+)
 
-for i in range(min(3, len(combined))):
-    example = combined[i]
+# Count all critical markers in one pass per example
+MARKER_RE = re.compile(r"<\|im_start\|>|<\|im_end\|>|<tool_call>|<\|endoftext\|>")
+marker_counts = [Counter(MARKER_RE.findall(formatted)) for formatted in formatted_examples]
 
+for i, (formatted, markers) in enumerate(zip(formatted_examples, marker_counts)):
     print(f"\n{'='*80}")
     print(f"EXAMPLE {i+1}:")
     print(f"{'='*80}")
 
-    # Apply chat template (this is what train.py does)
-    formatted = tokenizer.apply_chat_template(
-        example["messages"],
-        tokenize=False,
-        add_generation_prompt=False
-    )
-
     print(formatted)
 
     # Check for critical markers
-    has_im_start = "<|im_start|>" in formatted
-    has_im_end = "<|im_end|>" in formatted
-    has_tool_call = "<tool_call>" in formatted
-    has_endoftext = "<|endoftext|>" in formatted
+    has_im_start = "<|im_start|>" in markers
+    has_im_end = "<|im_end|>" in markers
+    has_tool_call = "<tool_call>" in markers
+    has_endoftext = "<|endoftext|>" in markers
 
     print(f"\n✓ Has <|im_start|>: {has_im_start}")
     print(f"✓ Has <|im_end|>: {has_im_end}")
@@ -89,16 +96,12 @@ print(f"\n{'='*80}")
 print("DIAGNOSIS:")
 print(f"{'='*80}")
 
-# Check one example in detail
-example = combined[0]
-formatted = tokenizer.apply_chat_template(
-    example["messages"],
-    tokenize=False,
-    add_generation_prompt=False
-)
+# Check one example in detail (already formatted above)
+example = examples[0]
+formatted = formatted_examples[0]
 
-# Count im_end tokens
-im_end_count = formatted.count("<|im_end|>")
+# Count im_end tokens (counted with the other markers above)
+im_end_count = marker_counts[0]["<|im_end|>"]
 message_count = len(example["messages"])
 
 print(f"\nFirst example has:")
@@ -1,49 +1,102 @@
 #!/usr/bin/env python3
-import json
+import argparse
 import sys
+from itertools import chain
+
+import fastjsonschema
+import orjson
+
+parser = argparse.ArgumentParser(description="Append Superpowers skill examples to a JSONL dataset")
+parser.add_argument(
+    "--out",
+    default='/Users/zachswift/projects/agent-power-tools/synthia/fine-tuning/dataset.jsonl',
+    help="JSONL file to append the examples to, or - for stdout (default: fine-tuning/dataset.jsonl)",
+)
+args = parser.parse_args()
 
 # Generate training examples based on Superpowers skills
-examples = []
+# Every block is serialized and validated first; the dataset is only appended
+# to once all of them pass, so a bad record never leaves a partial append (JSONL)
+# With --out - the JSONL goes to stdout for piping (e.g. `| zstd -3 > superpowers.jsonl.zst`)
+# and the summary goes to stderr instead
+output_file = args.out
+report = sys.stderr if output_file == "-" else sys.stdout
+lines = []
 
-# COLLABORATION: Brainstorming (50 examples total, showing 15 here as template)
-brainstorm_base = [
-    ("I want to add a dark mode toggle to my app", "I'm using the Brainstorming skill to refine your idea into a design.\n\nLet me start by understanding your requirements. Which approach resonates with you:\n\n1. **System-based**: Automatically match OS dark mode setting\n2. **User preference**: Manual toggle with persistent storage\n3. **Hybrid**: Default to system, allow user override\n\nWhich fits your use case?"),
-    ("I need to implement user authentication", "I'm using the Brainstorming skill to refine your idea into a design.\n\nBefore we proceed, I need to understand the security requirements:\n\n- What type of authentication do you need: Session-based, JWT tokens, or OAuth?"),
-    ("Build a caching layer for API responses", "I'm using the Brainstorming skill to refine your idea into a design.\n\nLet me explore different approaches:\n\n1. **In-memory cache**: Fast, simple, but loses data on restart\n2. **Redis cache**: Persistent, scalable, requires infrastructure\n3. **Hybrid**: In-memory with Redis fallback\n\nEach has trade-offs. Which constraints matter most: Speed, persistence, or simplicity?"),
-    ("Add real-time notifications to the dashboard", "I'm using the Brainstorming skill to refine your idea into a design.\n\nI've explored three approaches:\n\n1. **WebSockets**: True real-time, persistent connection\n   - Trade-offs: More complex, requires connection management\n   - Complexity: Medium\n\n2. **Server-Sent Events**: Simpler, uni-directional\n   - Trade-offs: HTTP-based, easier to implement\n   - Complexity: Low\n\n3. **Polling**: Simplest, higher latency\n   - Trade-offs: Less efficient, delayed updates\n   - Complexity: Very low\n\nWhich approach resonates with your needs?"),
-    ("I want to add a search feature", "I'm using the Brainstorming skill to refine your idea into a design.\n\nLet me understand the search scope:\n\n- What are you searching: Documents, users, products, or something else?"),
-    ("Create an export feature for reports", "I'm using the Brainstorming skill to refine your idea into a design.\n\nI need to understand the requirements:\n\n- What formats do you need: PDF, CSV, Excel, or multiple?"),
-    ("Build a file upload system", "I'm using the Brainstorming skill to refine your idea into a design.\n\nBefore designing, I need to understand constraints:\n\n- What's the maximum file size you need to support: Small (<10MB), Medium (<100MB), or Large (>100MB)?"),
-    ("Add analytics tracking", "I'm using the Brainstorming skill to refine your idea into a design.\n\nLet me explore approaches:\n\n1. **Third-party service**: Google Analytics, Mixpanel\n   - Trade-offs: Quick setup, external dependency, privacy concerns\n   - Complexity: Low\n\n2. **Self-hosted**: Plausible, Matomo\n   - Trade-offs: Full control, more infrastructure\n   - Complexity: Medium\n\n3. **Custom**: Build your own\n   - Trade-offs: Complete control, significant effort\n   - Complexity: High\n\nWhich approach fits your requirements?"),
-    ("Implement rate limiting", "I'm using the Brainstorming skill to refine your idea into a design.\n\nLet me understand the purpose:\n\n- What are you protecting against: API abuse, DDoS, or fair usage enforcement?"),
-    ("Create a job queue system", "I'm using the Brainstorming skill to refine your idea into a design.\n\nI've explored different approaches:\n\n1. **Redis-based queue**: BullMQ, Bee-Queue\n   - Trade-offs: Battle-tested, requires Redis\n   - Complexity: Low-Medium\n\n2. **Database queue**: PostgreSQL with polling\n   - Trade-offs: Simple, existing infrastructure, less efficient\n   - Complexity: Low\n\n3. **Message broker**: RabbitMQ, AWS SQS\n   - Trade-offs: Robust, scalable, more infrastructure\n   - Complexity: High\n\nWhich resonates with your architecture?"),
-]
+# Skill announcements shared by many assistant messages; the brainstorming
+# tuples below only store the text after BRAINSTORM_PREFIX
+BRAINSTORM_PREFIX = "I'm using the Brainstorming skill to refine your idea into a design.\n\n"
+DEBUG_PREFIX = "I'm using the Systematic Debugging skill.\n\n"
+TDD_PREFIX = "I'm using the Test-Driven Development skill.\n\n"
+SCALE_PREFIX = "I'm using the Scale Game skill.\n\n"
 
-# Convert to message format
-for user_msg, assistant_msg in brainstorm_base:
-    examples.append({
+def pair_example(user_msg, assistant_msg):
+    """A single user -> assistant exchange in message format"""
+    return {
         "messages": [
             {"role": "user", "content": user_msg},
             {"role": "assistant", "content": assistant_msg}
         ]
-    })
+    }
+
+# Shape of every record written here (single user -> assistant exchanges)
+EXAMPLE_SCHEMA = {
+    "type": "object",
+    "required": ["messages"],
+    "properties": {
+        "messages": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["role", "content"],
+                "properties": {
+                    "role": {"enum": ["user", "assistant"]},
+                    "content": {"type": "string"},
+                },
+            },
+        },
+    },
+}
+validate_example = fastjsonschema.compile(EXAMPLE_SCHEMA)
+
+def add_examples(records):
+    """Serialize and validate records, one JSON object per line; nothing is written until the end"""
+    for record in records:
+        try:
+            validate_example(record)
+        except fastjsonschema.JsonSchemaException as e:
+            raise ValueError(f"invalid example: {e}") from e
+        lines.append(orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE))
+
+# COLLABORATION: Brainstorming (50 examples total, showing 15 here as template)
+brainstorm_base = [
+    ("I want to add a dark mode toggle to my app", "Let me start by understanding your requirements. Which approach resonates with you:\n\n1. **System-based**: Automatically match OS dark mode setting\n2. **User preference**: Manual toggle with persistent storage\n3. **Hybrid**: Default to system, allow user override\n\nWhich fits your use case?"),
+    ("I need to implement user authentication", "Before we proceed, I need to understand the security requirements:\n\n- What type of authentication do you need: Session-based, JWT tokens, or OAuth?"),
+    ("Build a caching layer for API responses", "Let me explore different approaches:\n\n1. **In-memory cache**: Fast, simple, but loses data on restart\n2. **Redis cache**: Persistent, scalable, requires infrastructure\n3. **Hybrid**: In-memory with Redis fallback\n\nEach has trade-offs. Which constraints matter most: Speed, persistence, or simplicity?"),
+    ("Add real-time notifications to the dashboard", "I've explored three approaches:\n\n1. **WebSockets**: True real-time, persistent connection\n   - Trade-offs: More complex, requires connection management\n   - Complexity: Medium\n\n2. **Server-Sent Events**: Simpler, uni-directional\n   - Trade-offs: HTTP-based, easier to implement\n   - Complexity: Low\n\n3. **Polling**: Simplest, higher latency\n   - Trade-offs: Less efficient, delayed updates\n   - Complexity: Very low\n\nWhich approach resonates with your needs?"),
+    ("I want to add a search feature", "Let me understand the search scope:\n\n- What are you searching: Documents, users, products, or something else?"),
+    ("Create an export feature for reports", "I need to understand the requirements:\n\n- What formats do you need: PDF, CSV, Excel, or multiple?"),
+    ("Build a file upload system", "Before designing, I need to understand constraints:\n\n- What's the maximum file size you need to support: Small (<10MB), Medium (<100MB), or Large (>100MB)?"),
+    ("Add analytics tracking", "Let me explore approaches:\n\n1. **Third-party service**: Google Analytics, Mixpanel\n   - Trade-offs: Quick setup, external dependency, privacy concerns\n   - Complexity: Low\n\n2. **Self-hosted**: Plausible, Matomo\n   - Trade-offs: Full control, more infrastructure\n   - Complexity: Medium\n\n3. **Custom**: Build your own\n   - Trade-offs: Complete control, significant effort\n   - Complexity: High\n\nWhich approach fits your requirements?"),
+    ("Implement rate limiting", "Let me understand the purpose:\n\n- What are you protecting against: API abuse, DDoS, or fair usage enforcement?"),
+    ("Create a job queue system", "I've explored different approaches:\n\n1. **Redis-based queue**: BullMQ, Bee-Queue\n   - Trade-offs: Battle-tested, requires Redis\n   - Complexity: Low-Medium\n\n2. **Database queue**: PostgreSQL with polling\n   - Trade-offs: Simple, existing infrastructure, less efficient\n   - Complexity: Low\n\n3. **Message broker**: RabbitMQ, AWS SQS\n   - Trade-offs: Robust, scalable, more infrastructure\n   - Complexity: High\n\nWhich resonates with your architecture?"),
+]
 
 # Add more brainstorming variations
 more_brainstorm = [
-    ("Add multi-language support", "I'm using the Brainstorming skill to refine your idea into a design.\n\nI need to understand scope:\n\n- How many languages: 2-3, 5-10, or 20+?"),
-    ("Build an admin dashboard", "I'm using the Brainstorming skill to refine your idea into a design.\n\nLet me understand the requirements:\n\n- What functionality do you need: User management, analytics, content moderation, or all of the above?"),
-    ("Implement email notifications", "I'm using the Brainstorming skill to refine your idea into a design.\n\nLet me explore approaches:\n\n1. **Email service**: SendGrid, AWS SES\n   - Trade-offs: Reliable, costs scale with usage\n   - Complexity: Low\n\n2. **Self-hosted SMTP**: Postfix, dedicated server\n   - Trade-offs: Full control, deliverability challenges\n   - Complexity: High\n\n3. **Hybrid**: Service for transactional, self-hosted for bulk\n   - Trade-offs: Balanced, more complex setup\n   - Complexity: Medium\n\nWhich fits your needs?"),
-    ("Add pagination to the API", "I'm using the Brainstorming skill to refine your idea into a design.\n\nBefore designing, what's the data scale:\n\n- How many records: Hundreds, thousands, or millions?"),
-    ("Create a commenting system", "I'm using the Brainstorming skill to refine your idea into a design.\n\nI've explored approaches:\n\n1. **Flat comments**: Simple list, no nesting\n   - Trade-offs: Easy to implement, limited interaction\n   - Complexity: Low\n\n2. **Threaded comments**: Nested replies\n   - Trade-offs: Better UX, more complex queries\n   - Complexity: Medium\n\n3. **Hybrid**: Top-level with one level of replies\n   - Trade-offs: Balanced complexity and features\n   - Complexity: Medium-Low\n\nWhich approach resonates?"),
+    ("Add multi-language support", "I need to understand scope:\n\n- How many languages: 2-3, 5-10, or 20+?"),
+    ("Build an admin dashboard", "Let me understand the requirements:\n\n- What functionality do you need: User management, analytics, content moderation, or all of the above?"),
+    ("Implement email notifications", "Let me explore approaches:\n\n1. **Email service**: SendGrid, AWS SES\n   - Trade-offs: Reliable, costs scale with usage\n   - Complexity: Low\n\n2. **Self-hosted SMTP**: Postfix, dedicated server\n   - Trade-offs: Full control, deliverability challenges\n   - Complexity: High\n\n3. **Hybrid**: Service for transactional, self-hosted for bulk\n   - Trade-offs: Balanced, more complex setup\n   - Complexity: Medium\n\nWhich fits your needs?"),
+    ("Add pagination to the API", "Before designing, what's the data scale:\n\n- How many records: Hundreds, thousands, or millions?"),
+    ("Create a commenting system", "I've explored approaches:\n\n1. **Flat comments**: Simple list, no nesting\n   - Trade-offs: Easy to implement, limited interaction\n   - Complexity: Low\n\n2. **Threaded comments**: Nested replies\n   - Trade-offs: Better UX, more complex queries\n   - Complexity: Medium\n\n3. **Hybrid**: Top-level with one level of replies\n   - Trade-offs: Balanced complexity and features\n   - Complexity: Medium-Low\n\nWhich approach resonates?"),
 ]
 
-for user_msg, assistant_msg in more_brainstorm:
-    examples.append({
-        "messages": [
-            {"role": "user", "content": user_msg},
-            {"role": "assistant", "content": assistant_msg}
-        ]
-    })
+# Convert both lists to message format in one block, chained rather than concatenated
+add_examples(
+    pair_example(user_msg, BRAINSTORM_PREFIX + assistant_msg)
+    for user_msg, assistant_msg in chain(brainstorm_base, more_brainstorm)
+)
 
 # Add design presentation examples (showing incremental validation)
 design_examples = [
@@ -67,7 +120,7 @@ design_examples = [
     },
 ]
 
-examples.extend(design_examples)
+add_examples(design_examples)
 
 # DEBUGGING: Systematic Debugging with RED-YELLOW-GREEN workflow (40 examples)
 debug_examples = [
@@ -98,7 +151,7 @@ debug_examples = [
     {
         "messages": [
             {"role": "user", "content": "Tests are failing after refactoring"},
-            {"role": "assistant", "content": "I'm using the Systematic Debugging skill.\n\n**Phase 1: Root Cause Investigation**\n\nLet me check recent changes - what was modified in the refactoring?"}
+            {"role": "assistant", "content": DEBUG_PREFIX + "**Phase 1: Root Cause Investigation**\n\nLet me check recent changes - what was modified in the refactoring?"}
         ]
     },
     {
@@ -122,7 +175,7 @@ debug_examples = [
     {
         "messages": [
             {"role": "user", "content": "Database connection keeps timing out"},
-            {"role": "assistant", "content": "I'm using the Systematic Debugging skill.\n\n**Phase 1: Root Cause Investigation**\n\nThis is a multi-component system (app → network → database). I need to gather evidence at EACH layer before proposing fixes.\n\n**Layer 1: Application logs**\nLet me check what the app is reporting."}
+            {"role": "assistant", "content": DEBUG_PREFIX + "**Phase 1: Root Cause Investigation**\n\nThis is a multi-component system (app → network → database). I need to gather evidence at EACH layer before proposing fixes.\n\n**Layer 1: Application logs**\nLet me check what the app is reporting."}
         ]
     },
     {
@@ -152,7 +205,7 @@ debug_examples = [
     {
         "messages": [
             {"role": "user", "content": "Component re-renders infinitely"},
-            {"role": "assistant", "content": "I'm using the Systematic Debugging skill.\n\n**Phase 1: Root Cause Investigation - Trace Data Flow**\n\nInfinite re-renders suggest a dependency cycle. Let me trace where the loop originates by examining useEffect dependencies."}
+            {"role": "assistant", "content": DEBUG_PREFIX + "**Phase 1: Root Cause Investigation - Trace Data Flow**\n\nInfinite re-renders suggest a dependency cycle. Let me trace where the loop originates by examining useEffect dependencies."}
         ]
     },
     {
@@ -176,7 +229,7 @@ debug_examples = [
     {
         "messages": [
             {"role": "user", "content": "Build is failing with module not found"},
-            {"role": "assistant", "content": "I'm using the Systematic Debugging skill.\n\n**Phase 1: Root Cause Investigation - Read Error Messages Carefully**\n\nLet me read the complete error message - it often contains the exact solution."}
+            {"role": "assistant", "content": DEBUG_PREFIX + "**Phase 1: Root Cause Investigation - Read Error Messages Carefully**\n\nLet me read the complete error message - it often contains the exact solution."}
         ]
     },
     {
@@ -194,7 +247,7 @@ debug_examples = [
     {
         "messages": [
             {"role": "user", "content": "API endpoint returns empty array"},
-            {"role": "assistant", "content": "I'm using the Systematic Debugging skill.\n\n**Phase 1: Root Cause Investigation**\n\nBefore attempting fixes, let me gather evidence:\n1. Check if data exists in database\n2. Verify query is executing\n3. Check response transformation"}
+            {"role": "assistant", "content": DEBUG_PREFIX + "**Phase 1: Root Cause Investigation**\n\nBefore attempting fixes, let me gather evidence:\n1. Check if data exists in database\n2. Verify query is executing\n3. Check response transformation"}
         ]
     },
     {
@@ -206,7 +259,7 @@ debug_examples = [
     {
         "messages": [
             {"role": "user", "content": "Test failure: Expected true, got false"},
-            {"role": "assistant", "content": "I'm using the Systematic Debugging skill.\n\n**Phase 1: Root Cause Investigation - Reproduce Consistently**\n\nCan I trigger this failure reliably? Let me run the test multiple times to confirm it fails consistently."}
+            {"role": "assistant", "content": DEBUG_PREFIX + "**Phase 1: Root Cause Investigation - Reproduce Consistently**\n\nCan I trigger this failure reliably? Let me run the test multiple times to confirm it fails consistently."}
         ]
     },
     {
@@ -218,7 +271,7 @@ debug_examples = [
     {
         "messages": [
             {"role": "user", "content": "CI build passes locally but fails in CI"},
-            {"role": "assistant", "content": "I'm using the Systematic Debugging skill.\n\n**Phase 1: Root Cause Investigation - Check Recent Changes**\n\nWhat changed? Let me check:\n1. Code changes (git diff)\n2. Dependency changes (package.json)\n3. Environmental differences (Node version, OS)"}
+            {"role": "assistant", "content": DEBUG_PREFIX + "**Phase 1: Root Cause Investigation - Check Recent Changes**\n\nWhat changed? Let me check:\n1. Code changes (git diff)\n2. Dependency changes (package.json)\n3. Environmental differences (Node version, OS)"}
         ]
     },
     {
@@ -236,13 +289,13 @@ debug_examples = [
     {
         "messages": [
             {"role": "user", "content": "Form validation not working"},
-            {"role": "assistant", "content": "I'm using the Systematic Debugging skill.\n\n**Phase 1: Root Cause Investigation - Gather Evidence**\n\nWhat exactly is \"not working\"? Let me gather specific evidence:\n1. What input triggers the issue?\n2. What's the expected vs actual behavior?\n3. Are there error messages?"}
+            {"role": "assistant", "content": DEBUG_PREFIX + "**Phase 1: Root Cause Investigation - Gather Evidence**\n\nWhat exactly is \"not working\"? Let me gather specific evidence:\n1. What input triggers the issue?\n2. What's the expected vs actual behavior?\n3. Are there error messages?"}
         ]
     },
     {
         "messages": [
             {"role": "user", "content": "Memory leak in React component"},
-            {"role": "assistant", "content": "I'm using the Systematic Debugging skill.\n\n**Phase 1: Root Cause Investigation - Reproduce Consistently**\n\nMemory leaks need consistent reproduction. What are the exact steps:\n1. Which component?\n2. What user actions trigger it?\n3. How much memory grows over what time?"}
+            {"role": "assistant", "content": DEBUG_PREFIX + "**Phase 1: Root Cause Investigation - Reproduce Consistently**\n\nMemory leaks need consistent reproduction. What are the exact steps:\n1. Which component?\n2. What user actions trigger it?\n3. How much memory grows over what time?"}
         ]
     },
     {
@@ -260,7 +313,7 @@ debug_examples = [
     {
         "messages": [
             {"role": "user", "content": "WebSocket connection drops randomly"},
-            {"role": "assistant", "content": "I'm using the Systematic Debugging skill.\n\n**Phase 1: Root Cause Investigation - Gather Evidence in Multi-Component System**\n\nWebSocket = multi-layer system (client → network → server). I need diagnostic instrumentation at EACH layer:\n\n**Layer 1:** Client connection logs\n**Layer 2:** Network/proxy logs\n**Layer 3:** Server WebSocket handler logs\n\nLet me add logging to gather evidence showing WHERE it breaks."}
+            {"role": "assistant", "content": DEBUG_PREFIX + "**Phase 1: Root Cause Investigation - Gather Evidence in Multi-Component System**\n\nWebSocket = multi-layer system (client → network → server). I need diagnostic instrumentation at EACH layer:\n\n**Layer 1:** Client connection logs\n**Layer 2:** Network/proxy logs\n**Layer 3:** Server WebSocket handler logs\n\nLet me add logging to gather evidence showing WHERE it breaks."}
         ]
     },
     {
@@ -283,14 +336,14 @@ debug_examples = [
     }
 ]
 
-examples.extend(debug_examples)
+add_examples(debug_examples)
 
 # TESTING: TDD with RED-GREEN-REFACTOR (20 examples)
 tdd_examples = [
     {
         "messages": [
             {"role": "user", "content": "Implement a retry function for failed operations"},
-            {"role": "assistant", "content": "I'm using the Test-Driven Development skill.\n\n**RED - Write Failing Test**\n\nBefore writing ANY implementation code, I'll write a test that shows what should happen:\n\n```typescript\ntest('retries failed operations 3 times', async () => {\n  let attempts = 0;\n  const operation = () => {\n    attempts++;\n    if (attempts < 3) throw new Error('fail');\n    return 'success';\n  };\n\n  const result = await retryOperation(operation);\n\n  expect(result).toBe('success');\n  expect(attempts).toBe(3);\n});\n```\n\nNow let me run this test to watch it fail."}
+            {"role": "assistant", "content": TDD_PREFIX + "**RED - Write Failing Test**\n\nBefore writing ANY implementation code, I'll write a test that shows what should happen:\n\n```typescript\ntest('retries failed operations 3 times', async () => {\n  let attempts = 0;\n  const operation = () => {\n    attempts++;\n    if (attempts < 3) throw new Error('fail');\n    return 'success';\n  };\n\n  const result = await retryOperation(operation);\n\n  expect(result).toBe('success');\n  expect(attempts).toBe(3);\n});\n```\n\nNow let me run this test to watch it fail."}
         ]
     },
     {
@@ -338,7 +391,7 @@ tdd_examples = [
     {
         "messages": [
             {"role": "user", "content": "Implement validation for password strength"},
-            {"role": "assistant", "content": "I'm using the Test-Driven Development skill.\n\n**RED - Write Failing Test**\n\nOne minimal test showing desired behavior:\n\n```typescript\ntest('requires password with 8+ characters', () => {\n  const result = validatePassword('short');\n  expect(result.valid).toBe(false);\n  expect(result.error).toBe('Password must be at least 8 characters');\n});\n```\n\nRunning test to watch it fail..."}
+            {"role": "assistant", "content": TDD_PREFIX + "**RED - Write Failing Test**\n\nOne minimal test showing desired behavior:\n\n```typescript\ntest('requires password with 8+ characters', () => {\n  const result = validatePassword('short');\n  expect(result.valid).toBe(false);\n  expect(result.error).toBe('Password must be at least 8 characters');\n});\n```\n\nRunning test to watch it fail..."}
         ]
     },
     {
@@ -356,7 +409,7 @@ tdd_examples = [
     {
         "messages": [
             {"role": "user", "content": "Create a debounce function"},
-            {"role": "assistant", "content": "I'm using the Test-Driven Development skill.\n\n**RED - Write Failing Test**\n\n```typescript\ntest('delays function execution', async () => {\n  let called = false;\n  const fn = debounce(() => { called = true; }, 100);\n  \n  fn();\n  expect(called).toBe(false); // Not called immediately\n  \n  await sleep(150);\n  expect(called).toBe(true); // Called after delay\n});\n```\n\nWatching it fail..."}
+            {"role": "assistant", "content": TDD_PREFIX + "**RED - Write Failing Test**\n\n```typescript\ntest('delays function execution', async () => {\n  let called = false;\n  const fn = debounce(() => { called = true; }, 100);\n  \n  fn();\n  expect(called).toBe(false); // Not called immediately\n  \n  await sleep(150);\n  expect(called).toBe(true); // Called after delay\n});\n```\n\nWatching it fail..."}
         ]
     },
     {
@@ -368,7 +421,7 @@ tdd_examples = [
     {
         "messages": [
             {"role": "user", "content": "Implement a cache with TTL"},
-            {"role": "assistant", "content": "I'm using the Test-Driven Development skill.\n\n**RED - Write Failing Test**\n\nStart with one behavior:\n\n```typescript\ntest('stores and retrieves value', () => {\n  const cache = new Cache();\n  cache.set('key', 'value');\n  expect(cache.get('key')).toBe('value');\n});\n```\n\nLet me run this to watch it fail."}
+            {"role": "assistant", "content": TDD_PREFIX + "**RED - Write Failing Test**\n\nStart with one behavior:\n\n```typescript\ntest('stores and retrieves value', () => {\n  const cache = new Cache();\n  cache.set('key', 'value');\n  expect(cache.get('key')).toBe('value');\n});\n```\n\nLet me run this to watch it fail."}
         ]
     },
     {
@@ -409,7 +462,7 @@ tdd_examples = [
     }
 ]
 
-examples.extend(tdd_examples)
+add_examples(tdd_examples)
 
 # PROBLEM-SOLVING: Scale Game (20 examples)
 scale_examples = [
@@ -422,120 +475,120 @@ scale_examples = [
     {
         "messages": [
             {"role": "user", "content": "Should we use synchronous API calls?"},
-            {"role": "assistant", "content": "I'm using the Scale Game skill.\n\n**Scale Dimension: Speed**\n\n- **Normal scale:** Direct function calls work (milliseconds)\n- **At global scale:** Network latency makes synchronous calls unusable (seconds)\n- **Reveals:** Async/messaging becomes survival requirement, not optimization\n\n**Scale Dimension: Volume**\n\n- **10 requests:** Sync works\n- **1000 concurrent requests:** Thread pool exhausted, server hangs\n- **Reveals:** Need async I/O, non-blocking architecture\n\nExtreme testing shows sync APIs won't survive production load. Use async from the start."}
+            {"role": "assistant", "content": SCALE_PREFIX + "**Scale Dimension: Speed**\n\n- **Normal scale:** Direct function calls work (milliseconds)\n- **At global scale:** Network latency makes synchronous calls unusable (seconds)\n- **Reveals:** Async/messaging becomes survival requirement, not optimization\n\n**Scale Dimension: Volume**\n\n- **10 requests:** Sync works\n- **1000 concurrent requests:** Thread pool exhausted, server hangs\n- **Reveals:** Need async I/O, non-blocking architecture\n\nExtreme testing shows sync APIs won't survive production load. Use async from the start."}
         ]
     },
     {
         "messages": [
             {"role": "user", "content": "Is logging every request to a file ok?"},
-            {"role": "assistant", "content": "I'm using the Scale Game skill.\n\n**Scale Dimension: Volume**\n\n- **100 requests/day:** File logging works\n- **1M requests/day:** \n  - 1GB+ log files per day\n  - Disk I/O becomes bottleneck\n  - File rotation complexity\n- **Reveals:** Need structured logging service (ELK, CloudWatch)\n\n**Scale Dimension: Duration**\n\n- **1 week:** Manageable file size\n- **1 year:** Terabytes of logs, disk full\n- **Reveals:** Need retention policies, log aggregation\n\nExtreme testing shows file logging won't scale. Use a proper logging service."}
+            {"role": "assistant", "content": SCALE_PREFIX + "**Scale Dimension: Volume**\n\n- **100 requests/day:** File logging works\n- **1M requests/day:** \n  - 1GB+ log files per day\n  - Disk I/O becomes bottleneck\n  - File rotation complexity\n- **Reveals:** Need structured logging service (ELK, CloudWatch)\n\n**Scale Dimension: Duration**\n\n- **1 week:** Manageable file size\n- **1 year:** Terabytes of logs, disk full\n- **Reveals:** Need retention policies, log aggregation\n\nExtreme testing shows file logging won't scale. Use a proper logging service."}
         ]
     },
     {
         "messages": [
             {"role": "user", "content": "Can we store uploaded files in the database?"},
-            {"role": "assistant", "content": "I'm using the Scale Game skill.\n\n**Scale Dimension: Volume**\n\n- **10 files (1MB each):** Database stores 10MB, works fine\n- **10M files:** Database bloats to 10TB\n  - Backup times: hours\n  - Query performance: degraded\n  - Storage costs: extreme\n- **Reveals:** Database for metadata, object storage (S3) for files\n\n**Scale Dimension: File Size**\n\n- **Small files (<1MB):** Database handles it\n- **Large files (1GB videos):** Memory exhaustion, connection timeouts\n- **Reveals:** Streaming required, can't load into memory\n\nExtreme testing: Use object storage (S3, GCS) for files, database for metadata only."}
+            {"role": "assistant", "content": SCALE_PREFIX + "**Scale Dimension: Volume**\n\n- **10 files (1MB each):** Database stores 10MB, works fine\n- **10M files:** Database bloats to 10TB\n  - Backup times: hours\n  - Query performance: degraded\n  - Storage costs: extreme\n- **Reveals:** Database for metadata, object storage (S3) for files\n\n**Scale Dimension: File Size**\n\n- **Small files (<1MB):** Database handles it\n- **Large files (1GB videos):** Memory exhaustion, connection timeouts\n- **Reveals:** Streaming required, can't load into memory\n\nExtreme testing: Use object storage (S3, GCS) for files, database for metadata only."}
         ]
     },
     {
         "messages": [
             {"role": "user", "content": "Should we handle errors by retrying?"},
-            {"role": "assistant", "content": "I'm using the Scale Game skill.\n\n**Scale Dimension: Failure Rate**\n\n- **Never fails:** Retry logic unused\n- **Always fails:** Infinite retry loop, resource exhaustion\n- **Reveals:** Need:\n  - Max retry limit\n  - Exponential backoff\n  - Circuit breaker pattern\n\n**Scale Dimension: Volume**\n\n- **10 errors/day:** Simple retry works\n- **1M errors/day:** Retry storm overwhelms system\n- **Reveals:** Need error budget, graceful degradation\n\nExtreme testing shows naive retry is dangerous. Implement circuit breaker + exponential backoff."}
+            {"role": "assistant", "content": SCALE_PREFIX + "**Scale Dimension: Failure Rate**\n\n- **Never fails:** Retry logic unused\n- **Always fails:** Infinite retry loop, resource exhaustion\n- **Reveals:** Need:\n  - Max retry limit\n  - Exponential backoff\n  - Circuit breaker pattern\n\n**Scale Dimension: Volume**\n\n- **10 errors/day:** Simple retry works\n- **1M errors/day:** Retry storm overwhelms system\n- **Reveals:** Need error budget, graceful degradation\n\nExtreme testing shows naive retry is dangerous. Implement circuit breaker + exponential backoff."}
         ]
     },
     {
         "messages": [
             {"role": "user", "content": "Is client-side validation enough?"},
-            {"role": "assistant", "content": "I'm using the Scale Game skill.\n\n**Scale Dimension: Users**\n\n- **Honest users:** Client validation works\n- **1 malicious user:** Bypasses client validation entirely\n  - Tampers with JavaScript\n  - Sends direct API requests\n  - Injects malicious data\n- **Reveals:** Server-side validation is mandatory\n\nClient validation = UX enhancement.\nServer validation = security requirement.\n\nExtreme testing: Always validate on server."}
+            {"role": "assistant", "content": SCALE_PREFIX + "**Scale Dimension: Users**\n\n- **Honest users:** Client validation works\n- **1 malicious user:** Bypasses client validation entirely\n  - Tampers with JavaScript\n  - Sends direct API requests\n  - Injects malicious data\n- **Reveals:** Server-side validation is mandatory\n\nClient validation = UX enhancement.\nServer validation = security requirement.\n\nExtreme testing: Always validate on server."}
         ]
     },
     {
         "messages": [
             {"role": "user", "content": "Can we poll the API every second for updates?"},
-            {"role": "assistant", "content": "I'm using the Scale Game skill.\n\n**Scale Dimension: Users**\n\n- **1 user:** 1 request/second, works fine\n- **10,000 users:** 10,000 requests/second\n  - Server overwhelmed\n  - Database connection pool exhausted\n  - Costs explode\n- **Reveals:** Need WebSockets or Server-Sent Events for real-time updates\n\n**Scale Dimension: Duration**\n\n- **5 minutes:** Polling acceptable\n- **24/7:** Billions of unnecessary requests\n- **Reveals:** Push-based architecture required\n\nExtreme testing: Use WebSockets, not polling."}
+            {"role": "assistant", "content": SCALE_PREFIX + "**Scale Dimension: Users**\n\n- **1 user:** 1 request/second, works fine\n- **10,000 users:** 10,000 requests/second\n  - Server overwhelmed\n  - Database connection pool exhausted\n  - Costs explode\n- **Reveals:** Need WebSockets or Server-Sent Events for real-time updates\n\n**Scale Dimension: Duration**\n\n- **5 minutes:** Polling acceptable\n- **24/7:** Billions of unnecessary requests\n- **Reveals:** Push-based architecture required\n\nExtreme testing: Use WebSockets, not polling."}
         ]
     },
     {
         "messages": [
             {"role": "user", "content": "Should we cache API responses?"},
-            {"role": "assistant", "content": "I'm using the Scale Game skill.\n\n**Scale Dimension: Requests**\n\n- **10 requests/min:** No cache needed\n- **10,000 requests/min for same data:**\n  - Database overload\n  - Response time: seconds\n  - **With cache:** Instant, database protected\n- **Reveals:** Caching essential at scale\n\n**Scale Dimension: Data Freshness**\n\n- **Data changes rarely:** Cache for hours\n- **Data changes constantly:** Short TTL or cache invalidation needed\n- **Reveals:** TTL strategy depends on update frequency\n\nExtreme testing: Yes, implement caching with appropriate TTL."}
+            {"role": "assistant", "content": SCALE_PREFIX + "**Scale Dimension: Requests**\n\n- **10 requests/min:** No cache needed\n- **10,000 requests/min for same data:**\n  - Database overload\n  - Response time: seconds\n  - **With cache:** Instant, database protected\n- **Reveals:** Caching essential at scale\n\n**Scale Dimension: Data Freshness**\n\n- **Data changes rarely:** Cache for hours\n- **Data changes constantly:** Short TTL or cache invalidation needed\n- **Reveals:** TTL strategy depends on update frequency\n\nExtreme testing: Yes, implement caching with appropriate TTL."}
         ]
     },
     {
         "messages": [
             {"role": "user", "content": "Is it ok to load all users into memory?"},
-            {"role": "assistant", "content": "I'm using the Scale Game skill.\n\n**Scale Dimension: Volume**\n\n- **10 users:** Load all, works fine (few KB)\n- **1M users:** Memory exhaustion, server crash (100s of MB)\n- **Reveals:** Need pagination, streaming, or database queries\n\n**Scale Dimension: Duration**\n\n- **One-time script:** Loading all might be acceptable\n- **Long-running server:** Memory leak, gradual degradation\n- **Reveals:** Stateless queries, don't hold references\n\nExtreme testing: Never load unbounded data into memory. Use pagination."}
+            {"role": "assistant", "content": SCALE_PREFIX + "**Scale Dimension: Volume**\n\n- **10 users:** Load all, works fine (few KB)\n- **1M users:** Memory exhaustion, server crash (100s of MB)\n- **Reveals:** Need pagination, streaming, or database queries\n\n**Scale Dimension: Duration**\n\n- **One-time script:** Loading all might be acceptable\n- **Long-running server:** Memory leak, gradual degradation\n- **Reveals:** Stateless queries, don't hold references\n\nExtreme testing: Never load unbounded data into memory. Use pagination."}
         ]
     },
     {
         "messages": [
             {"role": "user", "content": "Can we generate reports synchronously on request?"},
-            {"role": "assistant", "content": "I'm using the Scale Game skill.\n\n**Scale Dimension: Data Size**\n\n- **10 records:** Generate instantly, works\n- **1M records:** \n  - Generation time: minutes\n  - HTTP timeout\n  - User experience: broken\n- **Reveals:** Need background job queue\n\n**Scale Dimension: Concurrency**\n\n- **1 report request:** Works\n- **100 concurrent requests:** Server CPU exhausted\n- **Reveals:** Rate limiting, queue system\n\nExtreme testing: Use job queue (background processing) for large reports."}
+            {"role": "assistant", "content": SCALE_PREFIX + "**Scale Dimension: Data Size**\n\n- **10 records:** Generate instantly, works\n- **1M records:** \n  - Generation time: minutes\n  - HTTP timeout\n  - User experience: broken\n- **Reveals:** Need background job queue\n\n**Scale Dimension: Concurrency**\n\n- **1 report request:** Works\n- **100 concurrent requests:** Server CPU exhausted\n- **Reveals:** Rate limiting, queue system\n\nExtreme testing: Use job queue (background processing) for large reports."}
         ]
     },
     {
         "messages": [
             {"role": "user", "content": "Should we use transactions for every database operation?"},
-            {"role": "assistant", "content": "I'm using the Scale Game skill.\n\n**Scale Dimension: Concurrency**\n\n- **1 user:** Transactions work perfectly\n- **1000 concurrent users:**\n  - Lock contention\n  - Deadlocks\n  - Throughput collapse\n- **Reveals:** Use transactions only when atomicity required\n\n**Scale Dimension: Duration**\n\n- **Instant operations:** Transactions fine\n- **Long-running operations:** Hold locks too long, block others\n- **Reveals:** Keep transactions short and focused\n\nExtreme testing: Use transactions judiciously, not by default."}
+            {"role": "assistant", "content": SCALE_PREFIX + "**Scale Dimension: Concurrency**\n\n- **1 user:** Transactions work perfectly\n- **1000 concurrent users:**\n  - Lock contention\n  - Deadlocks\n  - Throughput collapse\n- **Reveals:** Use transactions only when atomicity required\n\n**Scale Dimension: Duration**\n\n- **Instant operations:** Transactions fine\n- **Long-running operations:** Hold locks too long, block others\n- **Reveals:** Keep transactions short and focused\n\nExtreme testing: Use transactions judiciously, not by default."}
         ]
     },
     {
         "messages": [
             {"role": "user", "content": "Is sequential processing of uploads acceptable?"},
-            {"role": "assistant", "content": "I'm using the Scale Game skill.\n\n**Scale Dimension: Volume**\n\n- **1 file:** Sequential works\n- **1000 files:** \n  - Sequential: Hours to complete\n  - Parallel (10 workers): Minutes\n- **Reveals:** Parallel processing essential for batch operations\n\n**Scale Dimension: File Size**\n\n- **Small files:** Sequential acceptable\n- **Large files (GB):** Sequential blocks everything\n- **Reveals:** Need async job queue, progress tracking\n\nExtreme testing: Use parallel processing with job queue."}
+            {"role": "assistant", "content": SCALE_PREFIX + "**Scale Dimension: Volume**\n\n- **1 file:** Sequential works\n- **1000 files:** \n  - Sequential: Hours to complete\n  - Parallel (10 workers): Minutes\n- **Reveals:** Parallel processing essential for batch operations\n\n**Scale Dimension: File Size**\n\n- **Small files:** Sequential acceptable\n- **Large files (GB):** Sequential blocks everything\n- **Reveals:** Need async job queue, progress tracking\n\nExtreme testing: Use parallel processing with job queue."}
         ]
     },
     {
         "messages": [
             {"role": "user", "content": "Can we fetch all data then filter in JavaScript?"},
-            {"role": "assistant", "content": "I'm using the Scale Game skill.\n\n**Scale Dimension: Data Size**\n\n- **100 records:** Fetch all, filter client-side, works\n- **1M records:**\n  - Transfer time: minutes\n  - Browser memory: crash\n  - Bandwidth costs: extreme\n- **Reveals:** Filter server-side (SQL WHERE clause)\n\n**Scale Dimension: Network**\n\n- **LAN (fast):** Might work\n- **Mobile (slow):** Unusable, timeout\n- **Reveals:** Always filter server-side\n\nExtreme testing: Filter in database, return only needed data."}
+            {"role": "assistant", "content": SCALE_PREFIX + "**Scale Dimension: Data Size**\n\n- **100 records:** Fetch all, filter client-side, works\n- **1M records:**\n  - Transfer time: minutes\n  - Browser memory: crash\n  - Bandwidth costs: extreme\n- **Reveals:** Filter server-side (SQL WHERE clause)\n\n**Scale Dimension: Network**\n\n- **LAN (fast):** Might work\n- **Mobile (slow):** Unusable, timeout\n- **Reveals:** Always filter server-side\n\nExtreme testing: Filter in database, return only needed data."}
         ]
     },
     {
         "messages": [
             {"role": "user", "content": "Should we use UUIDs or auto-increment IDs?"},
-            {"role": "assistant", "content": "I'm using the Scale Game skill.\n\n**Scale Dimension: Distribution**\n\n- **Single server:** Auto-increment perfect\n- **Distributed system (sharding):** \n  - Auto-increment: ID conflicts\n  - UUID: Works across all nodes\n- **Reveals:** UUIDs for distributed, auto-increment for single server\n\n**Scale Dimension: Security**\n\n- **Internal system:** Sequential IDs fine\n- **Public API:** Sequential IDs leak business metrics\n  - Competitor sees order #1000000\n  - Knows your volume\n- **Reveals:** UUIDs prevent information leakage\n\nExtreme testing: Use UUIDs for distributed systems or public APIs."}
+            {"role": "assistant", "content": SCALE_PREFIX + "**Scale Dimension: Distribution**\n\n- **Single server:** Auto-increment perfect\n- **Distributed system (sharding):** \n  - Auto-increment: ID conflicts\n  - UUID: Works across all nodes\n- **Reveals:** UUIDs for distributed, auto-increment for single server\n\n**Scale Dimension: Security**\n\n- **Internal system:** Sequential IDs fine\n- **Public API:** Sequential IDs leak business metrics\n  - Competitor sees order #1000000\n  - Knows your volume\n- **Reveals:** UUIDs prevent information leakage\n\nExtreme testing: Use UUIDs for distributed systems or public APIs."}
         ]
     },
     {
         "messages": [
             {"role": "user", "content": "Can we store user preferences in cookies?"},
-            {"role": "assistant", "content": "I'm using the Scale Game skill.\n\n**Scale Dimension: Data Size**\n\n- **3 preferences (theme, language):** Cookies work (< 1KB)\n- **100 preferences:** Exceeds cookie size limit (4KB)\n- **Reveals:** Large preferences need server-side storage\n\n**Scale Dimension: Requests**\n\n- **1 page view:** Small cookie overhead acceptable\n- **1000 API calls:** Cookie sent with every request\n  - Bandwidth waste\n  - Slower responses\n- **Reveals:** Store server-side, send token only\n\nExtreme testing: Cookies for small, frequently-needed data only."}
+            {"role": "assistant", "content": SCALE_PREFIX + "**Scale Dimension: Data Size**\n\n- **3 preferences (theme, language):** Cookies work (< 1KB)\n- **100 preferences:** Exceeds cookie size limit (4KB)\n- **Reveals:** Large preferences need server-side storage\n\n**Scale Dimension: Requests**\n\n- **1 page view:** Small cookie overhead acceptable\n- **1000 API calls:** Cookie sent with every request\n  - Bandwidth waste\n  - Slower responses\n- **Reveals:** Store server-side, send token only\n\nExtreme testing: Cookies for small, frequently-needed data only."}
         ]
     },
     {
         "messages": [
             {"role": "user", "content": "Is it ok to delete data immediately when user clicks delete?"},
-            {"role": "assistant", "content": "I'm using the Scale Game skill.\n\n**Scale Dimension: Users**\n\n- **1 careful user:** Immediate delete works\n- **1000 users:** Someone will:\n  - Accidentally delete\n  - Blame your app\n  - Demand recovery\n- **Reveals:** Need soft delete or undo period\n\n**Scale Dimension: Data Value**\n\n- **Low value data:** Delete immediately acceptable\n- **Critical business data:** Immediate delete = disaster\n- **Reveals:** Soft delete + retention policy for important data\n\nExtreme testing: Implement soft delete with recovery window for user actions."}
+            {"role": "assistant", "content": SCALE_PREFIX + "**Scale Dimension: Users**\n\n- **1 careful user:** Immediate delete works\n- **1000 users:** Someone will:\n  - Accidentally delete\n  - Blame your app\n  - Demand recovery\n- **Reveals:** Need soft delete or undo period\n\n**Scale Dimension: Data Value**\n\n- **Low value data:** Delete immediately acceptable\n- **Critical business data:** Immediate delete = disaster\n- **Reveals:** Soft delete + retention policy for important data\n\nExtreme testing: Implement soft delete with recovery window for user actions."}
         ]
     },
     {
         "messages": [
             {"role": "user", "content": "Can we run database migrations during deployment?"},
-            {"role": "assistant", "content": "I'm using the Scale Game skill.\n\n**Scale Dimension: Data Size**\n\n- **1000 rows:** Migration runs in seconds\n- **1B rows:** Migration runs for hours\n  - Deployment blocked\n  - Downtime unacceptable\n- **Reveals:** Need online migrations or background jobs\n\n**Scale Dimension: Traffic**\n\n- **Low traffic site:** Brief downtime acceptable\n- **24/7 global service:** Zero downtime required\n- **Reveals:** Blue-green deployment, backward-compatible migrations\n\nExtreme testing: Design for online migrations from day one."}
+            {"role": "assistant", "content": SCALE_PREFIX + "**Scale Dimension: Data Size**\n\n- **1000 rows:** Migration runs in seconds\n- **1B rows:** Migration runs for hours\n  - Deployment blocked\n  - Downtime unacceptable\n- **Reveals:** Need online migrations or background jobs\n\n**Scale Dimension: Traffic**\n\n- **Low traffic site:** Brief downtime acceptable\n- **24/7 global service:** Zero downtime required\n- **Reveals:** Blue-green deployment, backward-compatible migrations\n\nExtreme testing: Design for online migrations from day one."}
         ]
     },
     {
         "messages": [
             {"role": "user", "content": "Should we email users on every activity?"},
-            {"role": "assistant", "content": "I'm using the Scale Game skill.\n\n**Scale Dimension: Activity Volume**\n\n- **1 activity/day:** Email acceptable\n- **100 activities/day:** Email spam, user unsubscribes\n- **Reveals:** Need digest emails or notification preferences\n\n**Scale Dimension: Users**\n\n- **10 users:** Send individual emails, works\n- **1M users:** Email service costs explode, rate limits hit\n- **Reveals:** Batch sending, email service optimization\n\nExtreme testing: Implement notification preferences and digest emails."}
+            {"role": "assistant", "content": SCALE_PREFIX + "**Scale Dimension: Activity Volume**\n\n- **1 activity/day:** Email acceptable\n- **100 activities/day:** Email spam, user unsubscribes\n- **Reveals:** Need digest emails or notification preferences\n\n**Scale Dimension: Users**\n\n- **10 users:** Send individual emails, works\n- **1M users:** Email service costs explode, rate limits hit\n- **Reveals:** Batch sending, email service optimization\n\nExtreme testing: Implement notification preferences and digest emails."}
         ]
     },
     {
         "messages": [
             {"role": "user", "content": "Is recursion ok for tree traversal?"},
-            {"role": "assistant", "content": "I'm using the Scale Game skill.\n\n**Scale Dimension: Tree Depth**\n\n- **10 levels deep:** Recursion works\n- **10,000 levels deep:** Stack overflow, crash\n- **Reveals:** Need iterative approach with explicit stack\n\n**Scale Dimension: Tree Size**\n\n- **100 nodes:** Recursion fine\n- **1M nodes:** Stack exhaustion\n- **Reveals:** Iterative with queue for large trees\n\nExtreme testing: Use iteration for unbounded depth/size."}
+            {"role": "assistant", "content": SCALE_PREFIX + "**Scale Dimension: Tree Depth**\n\n- **10 levels deep:** Recursion works\n- **10,000 levels deep:** Stack overflow, crash\n- **Reveals:** Need iterative approach with explicit stack\n\n**Scale Dimension: Tree Size**\n\n- **100 nodes:** Recursion fine\n- **1M nodes:** Stack exhaustion\n- **Reveals:** Iterative with queue for large trees\n\nExtreme testing: Use iteration for unbounded depth/size."}
         ]
     },
     {
         "messages": [
             {"role": "user", "content": "Can we use SELECT * in queries?"},
-            {"role": "assistant", "content": "I'm using the Scale Game skill.\n\n**Scale Dimension: Column Count**\n\n- **3 columns:** SELECT * acceptable\n- **50 columns (JSONB, arrays, text):** \n  - Transfer gigabytes unnecessarily\n  - Memory bloat\n  - Slow queries\n- **Reveals:** Select only needed columns\n\n**Scale Dimension: Rows**\n\n- **10 rows:** Doesn't matter\n- **1M rows with SELECT *:** Network transfer explosion\n- **Reveals:** Projection + pagination essential\n\nExtreme testing: Always specify columns explicitly."}
+            {"role": "assistant", "content": SCALE_PREFIX + "**Scale Dimension: Column Count**\n\n- **3 columns:** SELECT * acceptable\n- **50 columns (JSONB, arrays, text):** \n  - Transfer gigabytes unnecessarily\n  - Memory bloat\n  - Slow queries\n- **Reveals:** Select only needed columns\n\n**Scale Dimension: Rows**\n\n- **10 rows:** Doesn't matter\n- **1M rows with SELECT *:** Network transfer explosion\n- **Reveals:** Projection + pagination essential\n\nExtreme testing: Always specify columns explicitly."}
         ]
     }
 ]
 
-examples.extend(scale_examples)
+add_examples(scale_examples)
 
 # PROBLEM-SOLVING: When Stuck dispatching (10 examples)
 stuck_examples = [
@@ -601,18 +654,24 @@ stuck_examples = [
     }
 ]
 
-examples.extend(stuck_examples)
+add_examples(stuck_examples)
 
-# Write all examples to dataset
-output_file = '/Users/zachswift/projects/agent-power-tools/synthia/fine-tuning/dataset.jsonl'
-with open(output_file, 'a') as f:
-    for example in examples:
-        f.write(json.dumps(example) + '\n')
+# One write once every block has passed validation
+if output_file == "-":
+    sys.stdout.buffer.write(b"".join(lines))
+    sys.stdout.buffer.flush()
+else:
+    with open(output_file, 'ab') as out:
+        out.write(b"".join(lines))
 
-print(f"✓ Generated {len(examples)} examples")
-print(f"  - Collaboration (Brainstorming): {len(brainstorm_base) + len(more_brainstorm) + len(design_examples)}")
-print(f"  - Debugging (Systematic): {len(debug_examples)}")
-print(f"  - Testing (TDD): {len(tdd_examples)}")
-print(f"  - Problem-Solving (Scale): {len(scale_examples)}")
-print(f"  - Problem-Solving (When Stuck): {len(stuck_examples)}")
-print(f"\n✓ Appended to {output_file}")
+num_examples = (
+    len(brainstorm_base) + len(more_brainstorm) + len(design_examples) + len(debug_examples)
+    + len(tdd_examples) + len(scale_examples) + len(stuck_examples)
+)
+print(f"✓ Generated {num_examples} examples", file=report)
+print(f"  - Collaboration (Brainstorming): {len(brainstorm_base) + len(more_brainstorm) + len(design_examples)}", file=report)
+print(f"  - Debugging (Systematic): {len(debug_examples)}", file=report)
+print(f"  - Testing (TDD): {len(tdd_examples)}", file=report)
+print(f"  - Problem-Solving (Scale): {len(scale_examples)}", file=report)
+print(f"  - Problem-Solving (When Stuck): {len(stuck_examples)}", file=report)
+print(f"\n✓ Appended to {'stdout' if output_file == '-' else output_file}", file=report)